@@ -1,19 +1,39 @@
+import argparse
+import logging
 import sys
+import time
+from os import path
 
-from PyQt6.QtWidgets import QApplication
-
-from .controller import Controller
+_STARTED = time.perf_counter()
 
 
 def main():
     """
-    Initiate the application. Create a PyQt6 application and a Controller object.
+    Initiate the application. Create a PyQt6 application and a Controller object. With --profile, the operations of the
+    controller are profiled, see util.profiling. The measurements that are logged, e.g. the time to first paint, are
+    printed and written to log.txt next to the profiles then. The GUI is only imported here, so the daemon client can
+    be imported from this package without loading PyQt6.
     """
-    app = QApplication(sys.argv)
-    c = Controller()
+    from PyQt6.QtWidgets import QApplication
+
+    from .controller import Controller
+    from .util import profiling
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--profile', nargs='?', const='full', choices=profiling.MODES)
+    args, qt_args = parser.parse_known_args()
+    if args.profile:
+        profiler = profiling.enable(args.profile)
+        log_file = logging.FileHandler(path.join(profiler.directory, 'log.txt'))
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s',
+                            handlers=[logging.StreamHandler(), log_file])
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    c = Controller(_STARTED)
     try:
         c.view.show()
         exit_code = app.exec()
     finally:
         c.close()
+        profiling.disable()
     sys.exit(exit_code)
@@ -0,0 +1,287 @@
+import os
+import socket
+import struct
+import sys
+
+"""
+This module is the client of the converter daemon, see daemon.py. It only uses the standard library, so short-lived
+processes can convert without importing the rest of the package. The protocol is defined here as well.
+
+Every message is a frame: the length of the payload as unsigned 32 bit integer, followed by the payload. All numbers
+are big-endian. A request payload is the request id (I), the operation (B) and the amount (d), followed by the source
+currency and the number of target currencies (B) with the target currencies. Currencies are ASCII strings prefixed with
+their length (B). A response payload is the request id (I) and the status (B). On success it continues with the date
+as UTF-8 string prefixed with its length (H), the number of targets (H) and the converted amount and the rate (dd) of
+every target. On error it continues with the message, prefixed with its length (H). A client may send many requests
+before it reads the responses, they are answered in order. Since the daemon stops reading while its responses are not
+read, a client should not send more than a window of requests at once.
+"""
+
+OP_CONVERT = 1
+OP_PING = 2
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+"""
+The largest payload that is accepted.
+"""
+MAX_FRAME = 1 << 20
+
+_LENGTH = struct.Struct('!I')
+_REQUEST = struct.Struct('!IBd')
+_RESPONSE = struct.Struct('!IB')
+_SHORT = struct.Struct('!H')
+_ROW = struct.Struct('!dd')
+
+
+class DaemonError(Exception):
+    """
+    This exception is raised when the daemon answered a request with an error.
+    """
+    pass
+
+
+def socket_path() -> str:
+    """
+    Get the path of the socket of the daemon. It can be set with the CURRENCYCONVERTER_SOCKET environment variable.
+    :return: The path of the socket.
+    """
+    if 'CURRENCYCONVERTER_SOCKET' in os.environ:
+        return os.environ['CURRENCYCONVERTER_SOCKET']
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'currencyconverter.sock')
+    return os.path.join('/tmp', f"currencyconverter-{os.getuid()}.sock")
+
+
+def _string(value: str) -> bytes:
+    """
+    Encode a currency.
+    :param value: The currency.
+    :return: The length of the currency followed by the currency.
+    """
+    data = value.encode('ascii')
+    return bytes((len(data),)) + data
+
+
+def encode_request(request_id: int, source: str = '', amount: float = 0.0, targets=(), op: int = OP_CONVERT) -> bytes:
+    """
+    Encode a request as frame.
+    :param request_id: The id of the request, it is repeated in the response.
+    :param source: The currency to convert from.
+    :param amount: The amount to convert.
+    :param targets: The currencies to convert to.
+    :param op: The operation.
+    :return: The frame.
+    """
+    payload = _REQUEST.pack(request_id, op, amount) + _string(source) + bytes((len(targets),)) + \
+        b''.join(_string(target) for target in targets)
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def decode_request(payload: bytes) -> tuple[int, int, str, float, tuple[str, ...]]:
+    """
+    Decode the payload of a request.
+    :param payload: The payload.
+    :return: A tuple containing the request id, the operation, the source currency, the amount and the targets.
+    """
+    request_id, op, amount = _REQUEST.unpack_from(payload)
+    offset = _REQUEST.size
+    targets = []
+    length = payload[offset]
+    source = payload[offset + 1:offset + 1 + length].decode('ascii')
+    offset += 1 + length
+    count = payload[offset]
+    offset += 1
+    for _ in range(count):
+        length = payload[offset]
+        targets.append(payload[offset + 1:offset + 1 + length].decode('ascii'))
+        offset += 1 + length
+    return request_id, op, source, amount, tuple(targets)
+
+
+def encode_response(request_id: int, date: str, rows) -> bytes:
+    """
+    Encode a successful response as frame.
+    :param request_id: The id of the request.
+    :param date: The date of the rates.
+    :param rows: Tuples of converted amount and rate, in the order of the targets.
+    :return: The frame.
+    """
+    date = date.encode('utf-8')
+    payload = b''.join([_RESPONSE.pack(request_id, STATUS_OK), _SHORT.pack(len(date)), date, _SHORT.pack(len(rows)),
+                        *(_ROW.pack(amount, rate) for amount, rate in rows)])
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def encode_error(request_id: int, message: str) -> bytes:
+    """
+    Encode an error response as frame.
+    :param request_id: The id of the request.
+    :param message: The error message.
+    :return: The frame.
+    """
+    message = message.encode('utf-8')[:0xffff]
+    payload = _RESPONSE.pack(request_id, STATUS_ERROR) + _SHORT.pack(len(message)) + message
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def decode_response(payload: bytes) -> tuple[int, str, list[tuple[float, float]]]:
+    """
+    Decode the payload of a response.
+    :param payload: The payload.
+    :return: A tuple containing the request id, the date and tuples of converted amount and rate.
+    :raise DaemonError: If the response is an error.
+    """
+    request_id, status = _RESPONSE.unpack_from(payload)
+    offset = _RESPONSE.size
+    (length,) = _SHORT.unpack_from(payload, offset)
+    text = payload[offset + 2:offset + 2 + length].decode('utf-8')
+    if status != STATUS_OK:
+        raise DaemonError(text)
+    offset += 2 + length
+    (count,) = _SHORT.unpack_from(payload, offset)
+    offset += 2
+    return request_id, text, [_ROW.unpack_from(payload, offset + i * _ROW.size) for i in range(count)]
+
+
+class Client:
+    """
+    A connection to the daemon.
+    """
+
+    """
+    The number of requests that are sent before their responses are read. Larger batches are sent in windows of this
+    size, otherwise both sides could block on full socket buffers.
+    """
+    WINDOW = 512
+
+    def __init__(self, path: str = None):
+        """
+        Connect to the daemon.
+        :param path: The path of the socket, defaults to socket_path().
+        """
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path() if path is None else path)
+        self._file = self.socket.makefile('rb')
+        self._next_id = 0
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        self._file.close()
+        self.socket.close()
+
+    def __enter__(self) -> 'Client':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _read(self) -> bytes:
+        """
+        Read the payload of a frame.
+        :return: The payload.
+        :raise ConnectionError: If the daemon closed the connection, also in the middle of a frame.
+        """
+        header = self._file.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            raise ConnectionError("the daemon closed the connection")
+        (length,) = _LENGTH.unpack(header)
+        payload = self._file.read(length)
+        if len(payload) < length:
+            raise ConnectionError("the daemon closed the connection")
+        return payload
+
+    def convert(self, source: str, amount: float, targets) -> tuple[str, list[tuple[str, float, float]]]:
+        """
+        Convert an amount.
+        :param source: The currency to convert from.
+        :param amount: The amount to convert.
+        :param targets: The currencies to convert to.
+        :return: A tuple containing the date of the rates and tuples of target currency, converted amount and rate.
+        :raise DaemonError: If the daemon could not convert the amount.
+        """
+        return self.convert_many([(source, amount, targets)])[0]
+
+    def _ids(self, count: int) -> list[int]:
+        """
+        Get the ids of the next requests.
+        :param count: The number of requests.
+        :return: The ids, they wrap around at the largest unsigned 32 bit integer.
+        """
+        ids = [(self._next_id + i) & 0xffffffff for i in range(count)]
+        self._next_id = (self._next_id + count) & 0xffffffff
+        return ids
+
+    def _responses(self, ids: list[int]) -> list[bytes]:
+        """
+        Read the responses of requests. All responses are read before any of them is decoded, so a failed request does
+        not leave the responses of the others in the connection.
+        :param ids: The ids of the requests in the order they were sent.
+        :return: The payloads of the responses.
+        :raise ConnectionError: If a response does not belong to its request. The connection is closed then, since it
+        can not be told which responses are still pending.
+        """
+        payloads = [self._read() for _ in ids]
+        for request_id, payload in zip(ids, payloads):
+            (response_id, _) = _RESPONSE.unpack_from(payload)
+            if response_id != request_id:
+                self.close()
+                raise ConnectionError(f"got the response to request {response_id} instead of {request_id}")
+        return payloads
+
+    def convert_many(self, requests) -> list[tuple[str, list[tuple[str, float, float]]]]:
+        """
+        Convert many amounts. The requests are sent in windows of WINDOW requests, the responses of a window are read
+        before the next window is sent.
+        :param requests: Tuples of source currency, amount and targets.
+        :return: The results in the order of the requests, see convert().
+        :raise DaemonError: If the daemon could not convert one of the amounts. The responses of the other requests are
+        read anyway, so the connection can still be used.
+        """
+        requests = list(requests)
+        payloads = []
+        for first in range(0, len(requests), self.WINDOW):
+            window = requests[first:first + self.WINDOW]
+            ids = self._ids(len(window))
+            self.socket.sendall(b''.join(encode_request(request_id, source, amount, tuple(targets))
+                                         for request_id, (source, amount, targets) in zip(ids, window)))
+            payloads += self._responses(ids)
+        results = []
+        for (_, _, targets), payload in zip(requests, payloads):
+            _, date, rows = decode_response(payload)
+            results.append((date, [(target, amount, rate) for target, (amount, rate) in zip(targets, rows)]))
+        return results
+
+    def ping(self):
+        """
+        Check that the daemon answers.
+        """
+        ids = self._ids(1)
+        self.socket.sendall(encode_request(ids[0], op=OP_PING))
+        decode_response(self._responses(ids)[0])
+
+
+def main():
+    """
+    Convert from the command line: python -m currencyconverter.client AMOUNT SOURCE TARGET...
+    """
+    if len(sys.argv) < 4:
+        print(f"usage: {sys.argv[0]} AMOUNT SOURCE TARGET...", file=sys.stderr)
+        sys.exit(2)
+    try:
+        with Client() as client:
+            date, rows = client.convert(sys.argv[2].upper(), float(sys.argv[1]),
+                                        [target.upper() for target in sys.argv[3:]])
+    except (OSError, DaemonError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for target, amount, rate in rows:
+        print(f"{amount:.2f} {target} (rate: {rate}, data from {date})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,13 @@
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
 from .model import Source, SOURCES
-from .util.config import get_config, save_config, configure
+from .model.source import ConversionContext, ConversionRequest, ConversionResult, RateChange, RateSnapshot
+from .util import profiling
+from .util.config import get_config, save_config, flush_config, configure
+from .util.profiling import profiled
+from .util.session import Session, load_session, save_session
 from .view import View
 
 
@@ -8,22 +16,114 @@ class Controller:
     Controller class. This class is responsible for the communication between the model and the view.
     """
     source: Source = None
+    source_name: str = None
+
+    """
+    The amount, the currencies and the result of the displayed conversion. They are used to update the displayed rows
+    when the source publishes new rates.
+    """
+    amount: float = None
+    context: ConversionContext = None
+    result: ConversionResult = None
     config: dict = {}
     view: View
 
-    def __init__(self):
+    """
+    The maximum number of source currencies whose rates are loaded concurrently by convert_batch.
+    """
+    BATCH_WORKERS = 4
+
+    """
+    The number of days before the first transaction of a ledger whose rates are loaded as well, so transactions on
+    days without rates, e.g. weekends, are converted with the rates of the previous business day.
+    """
+    LEDGER_LOOKBACK = 7
+
+    def __init__(self, started: float = None):
         """
-        Initiate the controller. Create a View object.
+        Initiate the controller. Create a View object. The first source is chosen once the view has been painted.
+        :param started: The time.perf_counter() value at the start of the application.
         """
-        self.view = View(self, SOURCES)
-        self.reset()
+        self.view = View(self, SOURCES, started)
+
+    def start(self):
+        """
+        Start the application. This method is called once the view has been painted. The last session is restored if
+        there is one, otherwise the first source is chosen.
+        """
+        session = load_session()
+        if session is not None and session.source_name in SOURCES:
+            self.restore(session)
+        else:
+            self.reset()
 
     def reset(self):
         """
-        Reset the controller. This method is called when the application is started.
+        Reset the controller. This method is called when the reset button is pressed.
         """
         self.choose_source(list(SOURCES.keys())[0])
 
+    def restore(self, session: Session):
+        """
+        Restore a saved session. The saved currencies and results are displayed right away and marked as stale, the
+        source is revalidated in the background.
+        :param session: The saved session.
+        """
+        self.view.selected_source = session.source_name
+        self.choose_source(session.source_name, session.currencies)
+        self.source.source_currency(session.source)
+        for currency in session.targets:
+            self.source.add_target_currency(currency)
+        self.context = self.source.context
+        self.amount = session.amount
+        index = list(session.currencies[1]).index(session.source) if session.source in session.currencies[1] else 0
+        self.view.set_available_currencies(index, session.currencies[1], session.targets)
+        self.view.dsb_amount.setValue(session.amount)
+        if session.date is not None:
+            snapshot = RateSnapshot.create(session.date, {**session.rates, session.source: 1.0})
+            self.result = snapshot.convert(session.amount, self.context)
+            self.result.date = f"{session.date} (stale, updating)"
+            self.view.display_conversion(self.result)
+
+        source, context, amount = self.source, self.context, self.amount
+
+        def revalidate():
+            try:
+                try:
+                    currencies = source.catalog()
+                except NotImplementedError:
+                    # the currencies of sources without a catalog can only be loaded in the thread of the view
+                    currencies = None
+                result = source.convert(amount, context)
+            except Exception as e:
+                currencies, result = None, ConversionResult(e.__class__.__name__)
+            self.view.revalidated.emit((source, currencies, result))
+        threading.Thread(target=revalidate, name='revalidate', daemon=True).start()
+
+    def revalidated(self, revalidation: tuple):
+        """
+        Show the results of the background revalidation of a restored session. It is called in the thread of the view.
+        :param revalidation: A tuple containing the source that was revalidated, its currencies or None if they could
+        not be loaded and the fresh result of the restored conversion.
+        """
+        source, currencies, result = revalidation
+        if source is not self.source:
+            return
+        # the user may have changed the currencies while the source was revalidated, keep them
+        context = self.source.context
+        if currencies is not None and currencies[1] != self.view.currencies:
+            names = list(currencies[1])
+            index = names.index(context.source) if context.source in names else currencies[0]
+            self.view.set_available_currencies(index, currencies[1], context.targets)
+        if self.result is None or self.result.targets != result.targets or self.source.context != self.context:
+            return
+        if len(result) == 0 and len(result.targets) > 0:
+            self.view.set_status(f"data from {self.result.date}, update failed: {result.date}")
+            return
+        rows = tuple(i for i in range(len(result)) if result.rates[i] != self.result.rates[i])
+        self.result = result
+        self.view.update_conversion(result, rows)
+
     def available_currencies(self):
         """
         Get the available currencies from the source.
@@ -49,13 +149,97 @@ class Controller:
         """
         self.source.source_currency(currency)
 
+    @profiled('convert')
     def convert(self, amount: float):
         """
         Convert the amount of money from the source currency to the target currencies.
         :param amount: The amount of money to convert.
         """
-        conversion = self.source.convert(amount)
-        self.view.display_conversion(*conversion)
+        self.amount = amount
+        self.context = self.source.context
+        self.result = self.source.convert(amount, self.context)
+        self.view.display_conversion(self.result)
+
+    @profiled('convert_batch')
+    def convert_batch(self, requests: list[ConversionRequest]) -> list[ConversionResult]:
+        """
+        Convert many amounts at once. The requests are grouped by their source currency, the rates of every source
+        currency are loaded once for all of its requests. Different source currencies are loaded concurrently. The
+        selected currencies of the source are not changed.
+        :param requests: The conversions, as ConversionRequest or tuples of source currency, amount and targets.
+        :return: The results in the order of the requests. If the rates of a source currency could not be loaded, the
+        results of its requests are empty and their date is the name of the error. The same applies to a single request
+        whose currencies have no rates.
+        """
+        groups: dict[str, list[int]] = {}
+        for i, (source, _, _) in enumerate(requests):
+            groups.setdefault(source, []).append(i)
+
+        def load(source: str) -> RateSnapshot:
+            targets = dict.fromkeys(target for i in groups[source] for target in requests[i][2])
+            return self.source.snapshot(ConversionContext(source, tuple(targets)))
+
+        with ThreadPoolExecutor(min(len(groups), self.BATCH_WORKERS) or 1) as executor:
+            futures = {source: executor.submit(load, source) for source in groups}
+
+        results: list[ConversionResult] = [None] * len(requests)
+        for source, indices in groups.items():
+            try:
+                snapshot = futures[source].result()
+            except Exception as e:
+                for i in indices:
+                    results[i] = ConversionResult(e.__class__.__name__)
+                continue
+            for i in indices:
+                _, amount, targets = requests[i]
+                context = ConversionContext(source, tuple(targets))
+                if snapshot.covers(context):
+                    results[i] = snapshot.convert(amount, context)
+                else:
+                    results[i] = ConversionResult(KeyError.__name__)
+        return results
+
+    @profiled('convert_ledger')
+    def convert_ledger(self, dates, amounts, currencies, target: str, max_age: int = None):
+        """
+        Convert the transactions of a ledger, each with the rates that were valid on its date.
+        :param dates: The date of every transaction, e.g. a numpy array of datetime64 or a list of ISO dates.
+        :param amounts: The amount of every transaction.
+        :param currencies: The currency of every transaction.
+        :param target: The currency to convert all amounts to.
+        :param max_age: The largest number of days a rate may be older than its transaction, defaults to any age.
+        :return: A tuple containing numpy arrays of the converted amounts and the dates of the rates that were used.
+        Transactions without a rate are NaN and NaT.
+        """
+        import numpy as np
+
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        if len(dates) == 0:
+            return np.empty(0), np.empty(0, dtype='datetime64[D]')
+        codes = np.unique(np.asarray(currencies)).tolist()
+        history = self.source.rate_history(dates.min() - self.LEDGER_LOOKBACK, dates.max(), [target, *codes])
+        return history.convert_asof(dates, amounts, currencies, target, max_age)
+
+    def rates_changed(self, event: RateChange):
+        """
+        Update the displayed conversion after the source published new rates. Only the rows of the target currencies
+        whose rate changed are computed and displayed again. It is called in the thread of the view.
+        :param event: The rate change.
+        """
+        result = self.result
+        if result is None or len(result) == 0 or event.version <= result.version:
+            return
+        rows = event.affects(self.context)
+        if not rows:
+            return
+        rates = event.snapshot.rates
+        amounts, pair_rates = array('d', result.amounts), array('d', result.rates)
+        source_rate = rates.get(self.context.source, float('nan'))
+        for i in rows:
+            pair_rates[i] = rates.get(self.context.targets[i], float('nan')) / source_rate
+            amounts[i] = self.amount * pair_rates[i]
+        self.result = ConversionResult(event.date, result.targets, amounts, pair_rates, event.version)
+        self.view.update_conversion(self.result, rows)
 
     def request_string(self, title: str, placeholder: str, default: str = ''):
         """
@@ -76,18 +260,28 @@ class Controller:
         """
         return self.view.request_path(title, file_type, start_path)
 
-    def choose_source(self, name: str):
+    @profiled('choose_source')
+    def choose_source(self, name: str, currencies: tuple[int, dict[str, str]] = None):
         """
         Choose a source to use.
         :param name: The name of the source to use.
+        :param currencies: The currencies of the source and the index of the default currency, if they are already
+        known. Otherwise they are requested from the source.
         """
         self.view.reset()
+        self.result = None
         if self.source is not None:
-            save_config(self.source.__class__.__name__, self.source.config)
+            self._unsubscribe()
+            save_config(self.source_name, self.source.config)
             self.source.close()
-        source_class, config_meta = SOURCES[name]
-        config = get_config(self, name, config_meta)
-        self.source = source_class(config)
+        entry = SOURCES[name]
+        config = get_config(self, name, entry.config)
+        with profiling.operation('load_source'):
+            self.source = entry.load()(config)
+        self.source_name = name
+        self._unsubscribe = self.source.subscribe(self.view.rates_changed.emit)
+        if currencies is not None:
+            return
         available_currencies = 0, {}
         try:
             available_currencies = self.source.available_currencies()
@@ -100,7 +294,7 @@ class Controller:
         Reconfigure an option of the source.
         :param option: The option to reconfigure.
         """
-        options = list(SOURCES[self.source.__class__.__name__][1][option])
+        options = list(SOURCES[self.source_name].config[option])
         options[3] = self.source.config[option]
         self.source.config[option] = configure(self, options)
 
@@ -117,8 +311,29 @@ class Controller:
         :return:
         """
         if self.source is not None:
-            save_config(self.source.__class__.__name__, self.source.config)
+            self.save_session()
+            save_config(self.source_name, self.source.config)
             self.source.close()
+        flush_config()
+
+    def save_session(self):
+        """
+        Save the state of the session, so it can be restored on the next start.
+        """
+        currencies = getattr(self.view, 'currencies', None)
+        if not currencies:
+            return
+        context = self.source.context
+        names = list(currencies)
+        index = names.index(context.source) if context.source in names else 0
+        result = self.result
+        date, rates = None, {}
+        if result is not None and len(result) > 0 and result.targets == context.targets:
+            date = result.rate_date
+            rates = dict(zip(result.targets, result.rates))
+        amount = self.amount if self.amount is not None else self.view.dsb_amount.value()
+        save_session(Session(self.source_name, (index, currencies), context.source, context.targets, amount, date,
+                             rates))
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
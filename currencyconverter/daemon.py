@@ -0,0 +1,188 @@
+import argparse
+import logging
+import os
+import signal
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from .client import MAX_FRAME, OP_CONVERT, OP_PING, decode_request, encode_error, encode_response, socket_path
+from .model import SOURCES
+from .model.source import ConversionContext, RateSnapshot
+from .util.config import get_config
+
+"""
+This module contains the converter daemon. It keeps a source loaded and its rates cached, and answers conversions over
+a Unix domain socket, so scripts that convert many times a minute do not pay for starting Python and loading the source
+every time. The protocol is described in client.py. Run it with `python -m currencyconverter.daemon --help`.
+"""
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct('!I')
+
+
+class Headless:
+    """
+    Answers the configuration requests of get_config without a user interface. Every option gets its default value.
+    """
+
+    @staticmethod
+    def request_path(title: str, file_type: str, start_path: str = '.'):
+        return start_path
+
+    @staticmethod
+    def request_string(title: str, placeholder: str, default: str = ''):
+        return default
+
+
+class Daemon:
+    """
+    The state of the daemon: one source and the snapshots it returned, by source currency.
+    """
+
+    def __init__(self, source_name: str, ttl: float = 60.0):
+        """
+        Load the source.
+        :param source_name: The name of the source in SOURCES.
+        :param ttl: The number of seconds a snapshot is reused before the source is asked again.
+        """
+        entry = SOURCES[source_name]
+        self.source = entry.load()(get_config(Headless, source_name, entry.config))
+        self.ttl = ttl
+        self._snapshots: dict[str, tuple[float, RateSnapshot]] = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Close the source.
+        """
+        self.source.close()
+
+    def snapshot(self, context: ConversionContext) -> RateSnapshot:
+        """
+        Get a snapshot that covers a conversion. Cached snapshots are used while they are fresh.
+        :param context: The conversion.
+        :return: The snapshot.
+        """
+        cached = self._snapshots.get(context.source)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl and cached[1].covers(context):
+            return cached[1]
+        snapshot = self.source.snapshot(context)
+        if cached is not None and cached[1].date == snapshot.date:
+            snapshot = RateSnapshot.create(snapshot.date, {**cached[1].rates, **snapshot.rates})
+        with self._lock:
+            self._snapshots = {**self._snapshots, context.source: (time.monotonic(), snapshot)}
+        return snapshot
+
+    def handle(self, payload: bytes) -> bytes:
+        """
+        Answer a request.
+        :param payload: The payload of the request.
+        :return: The response frame.
+        """
+        request_id = 0
+        try:
+            request_id, op, source, amount, targets = decode_request(payload)
+            if op == OP_PING:
+                return encode_response(request_id, '', ())
+            if op != OP_CONVERT:
+                return encode_error(request_id, f"unknown operation {op}")
+            context = ConversionContext(source, targets)
+            result = self.snapshot(context).convert(amount, context)
+            return encode_response(request_id, result.date, tuple(zip(result.amounts, result.rates)))
+        except Exception as e:
+            return encode_error(request_id, f"{e.__class__.__name__}: {e}")
+
+
+class Handler(socketserver.BaseRequestHandler):
+    """
+    Answers the requests of one connection. All complete requests that arrived together are answered with a single
+    write, so pipelined requests cost one system call per batch.
+    """
+
+    def handle(self):
+        daemon: Daemon = self.server.daemon
+        buffer = bytearray()
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except ConnectionResetError:
+                return
+            if not data:
+                return
+            buffer += data
+            responses = []
+            offset = 0
+            while len(buffer) - offset >= _LENGTH.size:
+                (length,) = _LENGTH.unpack_from(buffer, offset)
+                if length > MAX_FRAME:
+                    logger.warning("closing connection after a frame of %d bytes", length)
+                    return
+                end = offset + _LENGTH.size + length
+                if end > len(buffer):
+                    break
+                responses.append(daemon.handle(bytes(buffer[offset + _LENGTH.size:end])))
+                offset = end
+            del buffer[:offset]
+            if responses:
+                try:
+                    self.request.sendall(b''.join(responses))
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client closed the connection without reading its responses
+                    return
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    """
+    The socket server of the daemon. Every connection is handled in its own thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, path: str, daemon: Daemon):
+        """
+        Bind the socket. A socket file that is left over from a daemon that did not shut down cleanly is replaced.
+        :param path: The path of the socket.
+        :param daemon: The daemon that answers the requests.
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        self.daemon = daemon
+        self.path = path
+        super().__init__(path, Handler)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def main():
+    """
+    Run the daemon from the command line until it is interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Answer conversions over a Unix domain socket.")
+    parser.add_argument('--source', default=next(iter(SOURCES)), choices=list(SOURCES), help="the source to use")
+    parser.add_argument('--socket', default=socket_path(), help="the path of the socket")
+    parser.add_argument('--ttl', type=float, default=60.0, help="seconds the rates of a currency are reused")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # leave through the context manager on SIGTERM as well, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    daemon = Daemon(args.source, args.ttl)
+    with Server(args.socket, daemon) as server:
+        logger.info("serving %s on %s", args.source, args.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,92 @@
+import importlib
+from importlib.metadata import entry_points
 from typing import Callable
 
 from .source import Source
-from .local import Local
-from .exchangeratesio import ExchangeRatesIO
-from .builtin import Builtin
 
 """
 This module contains the model classes for the currency converter. The model
 classes are responsible for retrieving the exchange rates from various sources.
 """
 
-SOURCES: dict[str, tuple[Callable[[dict], Source], dict]] = {
-    Builtin.__name__: (Builtin, {}),
-    Local.__name__: (Local, {'path': ('path', 'Exchange Rate Data Path', 'JSON files (*.json)', '.')}),
-    ExchangeRatesIO.__name__: (ExchangeRatesIO, {'apikey': (str, 'API Key', 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX', '')}),
+ENTRY_POINT_GROUP = 'currencyconverter.sources'
+
+
+class SourceEntry:
+    """
+    This class describes a source without importing it. The source class is only imported when it is loaded.
+    """
+
+    def __init__(self, name: str, target: str, config: dict = None, entry_point=None):
+        """
+        Initialize the entry.
+        :param name: The name of the source.
+        :param target: The location of the source class in the form "module:Class". Relative module names are resolved
+        against this package.
+        :param config: The configuration format of the source. If it is None, it is read from the CONFIG attribute of
+        the source class when it is needed.
+        :param entry_point: The entry point that provides the source, if it is a third-party source.
+        """
+        self.name = name
+        self.target = target
+        self._config = config
+        self._entry_point = entry_point
+        self._class = None
+
+    def load(self) -> Callable[[dict], Source]:
+        """
+        Import the source class.
+        :return: The source class.
+        """
+        if self._class is None:
+            if self._entry_point is not None:
+                self._class = self._entry_point.load()
+            else:
+                module, name = self.target.split(':')
+                self._class = getattr(importlib.import_module(module, __name__), name)
+        return self._class
+
+    @property
+    def config(self) -> dict:
+        """
+        The configuration format of the source.
+        """
+        if self._config is None:
+            self._config = getattr(self.load(), 'CONFIG', {})
+        return self._config
+
+
+def discover_sources() -> dict[str, SourceEntry]:
+    """
+    Find the sources that are provided by other packages through the currencyconverter.sources entry point group.
+    :return: A dictionary that contains an entry for every found source.
+    """
+    return {
+        entry_point.name: SourceEntry(entry_point.name, entry_point.value, entry_point=entry_point)
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP)
+    }
+
+
+_APIKEY = (str, 'API Key', 'XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX', '')
+_PATH = ('path', 'Exchange Rate Data Path', 'Exchange rate files (*.json *.csv *.xml);;JSON files (*.json);;'
+                                               'ECB CSV files (*.csv);;ECB XML files (*.xml)', '.')
+
+SOURCES: dict[str, SourceEntry] = {
+    'Builtin': SourceEntry('Builtin', '.builtin:Builtin', {}),
+    'Local': SourceEntry('Local', '.local:Local', {'path': _PATH}),
+    'ExchangeRatesIO': SourceEntry('ExchangeRatesIO', '.exchangeratesio:ExchangeRatesIO', {'apikey': _APIKEY}),
+    'Fallback': SourceEntry('Fallback', '.fallback:Fallback', {'apikey': _APIKEY, 'path': _PATH}),
+    'Consensus': SourceEntry('Consensus', '.consensus:Consensus', {'apikey': _APIKEY, 'path': _PATH}),
 }
+for _name, _entry in discover_sources().items():
+    SOURCES.setdefault(_name, _entry)
+
+
+def __getattr__(name: str):
+    """
+    Import source classes on first access, so `from currencyconverter.model import Local` keeps working.
+    :param name: The name of the requested attribute.
+    """
+    if name in SOURCES:
+        return SOURCES[name].load()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
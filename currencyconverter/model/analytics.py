@@ -0,0 +1,231 @@
+import numpy as np
+
+from .history import RateHistory
+
+"""
+This module contains incremental rolling statistics over exchange rate snapshots. Every statistic is kept for all
+currency pairs at once in a matrix with one row per base currency and one column per target currency. Adding a snapshot
+costs a constant number of matrix operations, independent of the length of the history.
+"""
+
+
+class RollingMoments:
+    """
+    The rolling mean and variance of the last values of every matrix element. It uses Welford's algorithm, values that
+    leave the window are removed with the inverse update. NaN values are skipped, so every element keeps its own count.
+    """
+
+    def __init__(self, window: int, shape: tuple):
+        """
+        Initialize the statistics.
+        :param window: The number of values in the window.
+        :param shape: The shape of the values.
+        """
+        self.window = window
+        self.values = np.full((window,) + shape, np.nan)
+        self.count = 0
+        self.n = np.zeros(shape, dtype=int)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def push(self, value: np.ndarray):
+        """
+        Add a value. If the window is full, the oldest value is removed.
+        :param value: The new value.
+        """
+        slot = self.count % self.window
+        if self.count >= self.window:
+            old = self.values[slot]
+            valid = np.isfinite(old)
+            self.n -= valid
+            delta = np.where(valid, old - self._mean, 0.0)
+            self._mean -= delta / np.maximum(self.n, 1)
+            self._m2 -= delta * np.where(valid, old - self._mean, 0.0)
+            empty = self.n == 0
+            self._mean[empty] = 0.0
+            self._m2[empty] = 0.0
+        valid = np.isfinite(value)
+        self.n += valid
+        delta = np.where(valid, value - self._mean, 0.0)
+        self._mean += delta / np.maximum(self.n, 1)
+        self._m2 += delta * np.where(valid, value - self._mean, 0.0)
+        self.values[slot] = value
+        self.count += 1
+
+    def mean(self) -> np.ndarray:
+        """
+        Get the mean of the values in the window.
+        :return: The mean of every element, NaN if there are no values.
+        """
+        return np.where(self.n > 0, self._mean, np.nan)
+
+    def variance(self) -> np.ndarray:
+        """
+        Get the sample variance of the values in the window.
+        :return: The variance of every element, NaN if there are less than two values.
+        """
+        return np.where(self.n > 1, np.maximum(self._m2, 0.0) / np.maximum(self.n - 1, 1), np.nan)
+
+
+class SlidingExtreme:
+    """
+    The rolling minimum or maximum of the last values of every matrix element. A monotonic deque per element can not be
+    vectorized, so the window is kept as two stacks instead: values are pushed onto the back stack, which keeps its
+    running extreme, and the front stack holds the suffix extremes of an earlier block of values. When the front stack
+    runs empty, the back stack is turned over in one vectorized step. This is amortized O(1) per value as well.
+    """
+
+    def __init__(self, window: int, shape: tuple, function=np.fmin):
+        """
+        Initialize the statistic.
+        :param window: The number of values in the window.
+        :param shape: The shape of the values.
+        :param function: np.fmin for a rolling minimum, np.fmax for a rolling maximum. Both ignore NaN values.
+        """
+        self.window = window
+        self.function = function
+        self.neutral = np.inf if function is np.fmin else -np.inf
+        self.back = []
+        self.back_extreme = np.full(shape, self.neutral)
+        self.front = np.empty((0,) + shape)
+        self.front_position = 0
+
+    def push(self, value: np.ndarray):
+        """
+        Add a value. If the window is full, the oldest value is removed.
+        :param value: The new value.
+        """
+        self.back.append(value)
+        self.back_extreme = self.function(self.back_extreme, value)
+        if len(self.front) - self.front_position + len(self.back) > self.window:
+            if self.front_position == len(self.front):
+                self.front = self.function.accumulate(np.stack(self.back)[::-1])[::-1]
+                self.front_position = 0
+                self.back = []
+                self.back_extreme = np.full(self.back_extreme.shape, self.neutral)
+            self.front_position += 1
+
+    def value(self) -> np.ndarray:
+        """
+        Get the extreme of the values in the window.
+        :return: The extreme of every element, NaN if there are no values.
+        """
+        extreme = self.back_extreme
+        if self.front_position < len(self.front):
+            extreme = self.function(self.front[self.front_position], extreme)
+        return np.where(np.isinf(extreme), np.nan, extreme)
+
+
+class RollingAnalytics:
+    """
+    Rolling statistics for all pairs of a fixed set of currencies. The element [i, j] of every matrix belongs to the
+    conversion from currencies[i] to currencies[j]. The volatility is the standard deviation of the log returns.
+    """
+
+    def __init__(self, currencies: list[str], window: int = 30, alpha: float = 0.1):
+        """
+        Initialize the analytics.
+        :param currencies: The currencies to keep statistics for.
+        :param window: The number of snapshots in the rolling window.
+        :param alpha: The smoothing factor of the exponentially weighted moving average.
+        """
+        self.currencies = list(currencies)
+        self._columns = {currency: i for i, currency in enumerate(self.currencies)}
+        shape = (len(self.currencies), len(self.currencies))
+        self.alpha = alpha
+        self.date = None
+        self._moments = RollingMoments(window, shape)
+        self._returns = RollingMoments(window, shape)
+        self._minimum = SlidingExtreme(window, shape, np.fmin)
+        self._maximum = SlidingExtreme(window, shape, np.fmax)
+        self._ewma = None
+        self._last = None
+
+    def update(self, rates, date=None):
+        """
+        Add a snapshot of exchange rates.
+        :param rates: A dictionary that maps currencies to their rate against a common base, or an array of rates in
+        the order of the currencies. Currencies without a rate are NaN.
+        :param date: The date of the snapshot.
+        """
+        if isinstance(rates, dict):
+            vector = np.full(len(self.currencies), np.nan)
+            for currency, rate in rates.items():
+                if currency in self._columns:
+                    vector[self._columns[currency]] = rate
+        else:
+            vector = np.asarray(rates, dtype=float)
+        log_rates = np.log(vector)
+        log_pairs = log_rates[np.newaxis, :] - log_rates[:, np.newaxis]
+        pairs = np.exp(log_pairs)
+
+        self._moments.push(pairs)
+        self._minimum.push(pairs)
+        self._maximum.push(pairs)
+        if self._last is not None:
+            self._returns.push(log_pairs - self._last)
+        if self._ewma is None:
+            self._ewma = pairs
+        else:
+            smoothed = self._ewma + self.alpha * (pairs - self._ewma)
+            self._ewma = np.where(np.isnan(self._ewma), pairs, np.where(np.isnan(pairs), self._ewma, smoothed))
+        self._last = log_pairs
+        self.date = date
+
+    def feed(self, history: RateHistory):
+        """
+        Add all snapshots of a rate history in order.
+        :param history: The history to add.
+        """
+        history = history.slice(currencies=[c for c in self.currencies if c in history.currencies])
+        columns = [self._columns[currency] for currency in history.currencies]
+        vector = np.full(len(self.currencies), np.nan)
+        for date, row in zip(history.dates, history.rates):
+            vector[columns] = row
+            self.update(vector, date)
+
+    def mean(self) -> np.ndarray:
+        """
+        Get the moving average of all pairs.
+        """
+        return self._moments.mean()
+
+    def minimum(self) -> np.ndarray:
+        """
+        Get the rolling minimum of all pairs.
+        """
+        return self._minimum.value()
+
+    def maximum(self) -> np.ndarray:
+        """
+        Get the rolling maximum of all pairs.
+        """
+        return self._maximum.value()
+
+    def volatility(self) -> np.ndarray:
+        """
+        Get the standard deviation of the log returns of all pairs.
+        """
+        return np.sqrt(self._returns.variance())
+
+    def ewma(self) -> np.ndarray:
+        """
+        Get the exponentially weighted moving average of all pairs.
+        """
+        return self._ewma.copy()
+
+    def pair(self, base: str, target: str) -> dict[str, float]:
+        """
+        Get all statistics of a single pair.
+        :param base: The currency that is converted from.
+        :param target: The currency that is converted to.
+        :return: A dictionary that maps the names of the statistics to their values.
+        """
+        i, j = self._columns[base], self._columns[target]
+        return {
+            'mean': float(self.mean()[i, j]),
+            'minimum': float(self.minimum()[i, j]),
+            'maximum': float(self.maximum()[i, j]),
+            'volatility': float(self.volatility()[i, j]),
+            'ewma': float(self._ewma[i, j]),
+        }
@@ -1,4 +1,4 @@
-from .source import Source
+from .source import Source, RateSnapshot, ConversionContext
 
 
 DATE = "2022-11-23"
@@ -350,8 +350,15 @@ class Builtin(Source):
     """
     A source that is built into the library.
     """
-    _target_currencies: list[str] = []
-    _source_currency: str = list(RATES.keys())[0]
+    _SNAPSHOT = RateSnapshot.create(DATE, RATES)
+
+    def __init__(self, config: dict):
+        """
+        Initialize the source.
+        :param config: The configuration of the source.
+        """
+        super().__init__(config)
+        self.source_currency(list(RATES.keys())[0])
 
     def close(self):
         """
@@ -359,44 +366,22 @@ class Builtin(Source):
         """
         pass
 
-    def available_currencies(self) -> tuple[int, dict[str, str]]:
+    def catalog(self) -> tuple[int, dict[str, str]]:
         """
         Get the available currencies.
         :return: A tuple of the index of the default currency and a dictionary of all available currencies.
         """
         index = list(CURRENCIES.keys()).index('EUR')
         index = 0 if index == -1 else index
-        self._source_currency = list(CURRENCIES.keys())[index]
         return index, CURRENCIES
 
-    def add_target_currency(self, currency: str):
-        """
-        Add a target currency.
-        :param currency: The currency to add.
-        """
-        self._target_currencies.append(currency)
-
-    def remove_target_currency(self, currency: str):
-        """
-        Remove a target currency.
-        :param currency: The currency to remove.
-        """
-        self._target_currencies.remove(currency)
-
-    def source_currency(self, currency: str):
-        """
-        Set the source currency.
-        :param currency: The currency to set.
-        """
-        self._source_currency = currency
-
-    def convert(self, amount: float) -> tuple[str, list[tuple[str, float, float]]]:
+    def snapshot(self, context: ConversionContext = None) -> RateSnapshot:
         """
-        Convert the amount.
-        :param amount: The amount to convert.
-        :return: A tuple of the source currency and a list of tuples of the target currency, the rate and the converted amount.
+        Get the built-in rates.
+        :param context: Not used, the snapshot always contains all currencies.
+        :return: The snapshot of the built-in rates.
         """
-        return DATE, [(currency, amount / RATES[self._source_currency] * RATES[currency], RATES[currency] / RATES[self._source_currency]) for currency in self._target_currencies]
+        return self._SNAPSHOT
 
     def config_changed(self):
         """
@@ -0,0 +1,276 @@
+import math
+import statistics
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date as Date, timedelta
+from typing import NamedTuple
+
+from .builtin import Builtin
+from .exchangeratesio import ExchangeRatesIO
+from .fallback import Call, Tier, TierFailure
+from .local import Local
+from .source import Source, RateSnapshot, ConversionContext, ConversionResult
+
+"""
+This module contains the consensus source. It asks several sources for the same rates at the same time and combines
+their answers, so a single wrong or outdated feed does not decide the result.
+"""
+
+
+class ConsensusRates(NamedTuple):
+    """
+    The combined rates of a conversion.
+    """
+
+    """
+    The newest date of the rates that were used.
+    """
+    date: str
+
+    """
+    The consensus rate of every currency of the conversion against the source currency.
+    """
+    rates: dict[str, float]
+
+    """
+    The standard deviation of the logarithms of the rates that were combined, which is about the relative spread of the
+    rates. It is 0 if only one source had a rate.
+    """
+    dispersion: dict[str, float]
+
+    """
+    The names of the sources whose rate was used, per currency.
+    """
+    sources: dict[str, tuple[str, ...]]
+
+    """
+    The sources that were left out entirely, with the reason.
+    """
+    dropped: dict[str, str]
+
+
+class Consensus(Source):
+    """
+    This source queries ExchangeRatesIO, Local and Builtin concurrently and combines their rates. Every source has its
+    own timeout, counted from when its call starts, and sources whose abandoned calls are still running are
+    skipped, so the total latency is bounded by the largest timeout. Sources whose data is older than the newest data
+    by more than STALE_DAYS are dropped, and per currency the rates that deviate from the median by more than
+    OUTLIER_TOLERANCE are dropped. The remaining rates are combined by their median or their trimmed mean.
+    """
+    _currencies: dict[str, str] = None
+
+    MEMBERS = (ExchangeRatesIO, Local, Builtin)
+
+    """
+    The number of seconds to wait for a source. TIMEOUTS overrides it per source name.
+    """
+    TIMEOUT = 2.0
+    TIMEOUTS: dict[str, float] = {'Local': 1.0, 'Builtin': 0.5}
+
+    """
+    The number of worker threads. Sources whose abandoned calls are still running are not called, so concurrent
+    consensus calls share the threads without queueing behind calls that were given up on.
+    """
+    WORKERS = 8
+
+    STALE_DAYS = 7
+
+    """
+    The largest relative deviation from the median that is not an outlier.
+    """
+    OUTLIER_TOLERANCE = 0.02
+
+    """
+    'median' or 'trimmed' for the trimmed mean, which leaves out TRIM of the rates at each end.
+    """
+    METHOD = 'median'
+    TRIM = 0.2
+
+    """
+    The result of the last consensus, for displaying it. Conversions do not read it, another conversion may replace it
+    at any time.
+    """
+    last: ConsensusRates = None
+
+    def __init__(self, config: dict):
+        """
+        Initialize the consensus. Sources that can not be created are skipped.
+        :param config: The configuration for this source. It is shared with all sources.
+        """
+        super().__init__(config)
+        self._members = [Tier(source_class, config, self._timeout(source_class.__name__))
+                         for source_class in self.MEMBERS]
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS)
+
+    def close(self):
+        """
+        Close all sources.
+        """
+        self._executor.shutdown(wait=False)
+        for member in self._members:
+            if member.source is not None:
+                member.source.close()
+
+    def catalog(self) -> tuple[int, dict[str, str]]:
+        """
+        This returns the currencies of all sources that answered and the index of the default currency.
+        :return: A tuple containing the index of the default currency and a dictionary that contains all the available
+        currencies.
+        """
+        if self._currencies is None:
+            answers, _ = self._gather(lambda source: source.catalog()[1])
+            if not answers:
+                raise TierFailure("no source answered")
+            currencies = {}
+            for catalog in answers.values():
+                for code, name in catalog.items():
+                    currencies.setdefault(code, name)
+            self._currencies = dict(sorted(currencies.items()))
+        index = list(self._currencies.keys()).index('EUR') if 'EUR' in self._currencies else 0
+        return index, self._currencies
+
+    def snapshot(self, context: ConversionContext = None) -> RateSnapshot:
+        """
+        This returns the consensus rates of a conversion against its source currency.
+        :param context: The conversion, defaults to the context of the source.
+        :return: A snapshot that contains the currencies of the conversion.
+        :raise TierFailure: If no source had usable rates.
+        """
+        context = self.context if context is None else context
+        consensus = self.consensus(context)
+        snapshot = RateSnapshot.create(consensus.date, consensus.rates)
+        self._publish(snapshot, context.source)
+        return snapshot
+
+    def convert(self, amount: float, context: ConversionContext = None) -> ConversionResult:
+        """
+        This converts the given amount with the consensus rates. The date of the result names the number of sources and
+        the largest dispersion of the rates.
+        :param amount: The amount to convert.
+        :param context: The currencies of the conversion, defaults to the context of the source.
+        :return: The result of the conversion. If no source answered, it is empty and its date is the name of the error.
+        """
+        context = self.context if context is None else context
+        try:
+            consensus = self.consensus(context)
+        except TierFailure as e:
+            return ConversionResult(e.__class__.__name__)
+        snapshot = RateSnapshot.create(consensus.date, consensus.rates)
+        self._publish(snapshot, context.source)
+        result = snapshot.convert(amount, context)
+        count = len({name for names in consensus.sources.values() for name in names})
+        spread = max(consensus.dispersion.values(), default=0.0)
+        result.date = f"{result.date}, consensus of {count} sources, dispersion {spread:.2%}"
+        return result
+
+    def consensus(self, context: ConversionContext) -> ConsensusRates:
+        """
+        Query all sources and combine their rates.
+        :param context: The conversion.
+        :return: The combined rates.
+        :raise TierFailure: If no source had usable rates.
+        """
+        answers, dropped = self._gather(lambda source: source.snapshot(context))
+        dates = {name: Date.fromisoformat(snapshot.date) for name, snapshot in answers.items()}
+        if dates:
+            newest = max(dates.values())
+            for name, day in dates.items():
+                if newest - day > timedelta(days=self.STALE_DAYS):
+                    dropped[name] = f"stale ({day})"
+                    del answers[name]
+
+        rates, dispersion, sources = {}, {}, {}
+        for currency in dict.fromkeys((context.source, *context.targets)):
+            quotes = {name: snapshot.rate(context.source, currency) for name, snapshot in answers.items()
+                      if context.source in snapshot.rates and currency in snapshot.rates}
+            quotes = {name: rate for name, rate in quotes.items() if rate > 0 and math.isfinite(rate)}
+            if not quotes:
+                raise TierFailure(f"no source has a rate for {currency}")
+            logs = {name: math.log(rate) for name, rate in quotes.items()}
+            median = statistics.median(logs.values())
+            if len(logs) > 2:
+                logs = {name: value for name, value in logs.items()
+                        if abs(value - median) <= math.log1p(self.OUTLIER_TOLERANCE)}
+            rates[currency] = math.exp(self._combine(sorted(logs.values())))
+            dispersion[currency] = statistics.pstdev(logs.values()) if len(logs) > 1 else 0.0
+            sources[currency] = tuple(logs)
+
+        used = {name for names in sources.values() for name in names}
+        date = max(answers[name].date for name in used)
+        self.last = ConsensusRates(date, rates, dispersion, sources, dropped)
+        return self.last
+
+    def _combine(self, logs: list[float]) -> float:
+        """
+        Combine the logarithms of rates.
+        :param logs: The sorted logarithms.
+        :return: The median or the trimmed mean of the logarithms.
+        """
+        if self.METHOD == 'trimmed':
+            trim = int(len(logs) * self.TRIM)
+            kept = logs[trim:len(logs) - trim] or logs
+            return sum(kept) / len(kept)
+        return statistics.median(logs)
+
+    def _timeout(self, name: str) -> float:
+        """
+        Get the timeout of a source.
+        :param name: The name of the source.
+        :return: The number of seconds to wait for the source.
+        """
+        return self.TIMEOUTS.get(name, self.TIMEOUT)
+
+    def _gather(self, function) -> tuple[dict[str, any], dict[str, str]]:
+        """
+        Call a function with all sources at the same time. Each source gets its own timeout, counted from when its call
+        starts running. Calls that time out are abandoned, their results are ignored.
+        :param function: The function to call with a source.
+        :return: A tuple containing the results by source name and the reasons why the other sources have no result.
+        """
+        start = time.monotonic()
+        dropped = {}
+        calls: dict[Future, tuple[Tier, Call]] = {}
+        for member in self._members:
+            if not member.available():
+                dropped[member.name] = "busy" if member.abandoned else "unavailable"
+                continue
+            future, call = member.submit(self._executor, function)
+            calls[future] = member, call
+
+        def deadline(future: Future) -> float:
+            member, call = calls[future]
+            return (call.started or start) + self._timeout(member.name)
+
+        results = {}
+        pending = set(calls)
+        while pending:
+            now = time.monotonic()
+            for future in [future for future in pending if deadline(future) <= now]:
+                member, call = calls[future]
+                pending.discard(future)
+                member.abandon(future, call)
+                dropped[member.name] = "timeout"
+            if not pending:
+                break
+            done, pending = wait(pending, min(deadline(future) for future in pending) - now,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                member = calls[future][0]
+                if future.exception() is None:
+                    results[member.name] = future.result()
+                else:
+                    dropped[member.name] = future.exception().__class__.__name__
+        return results, dropped
+
+    def config_changed(self):
+        """
+        This method is called when the configuration has changed. Sources that could not be created before are
+        created again.
+        """
+        self._currencies = None
+        for member in self._members:
+            if member.source is None:
+                member.create(self.config)
+            else:
+                member.source.config_changed()
+            member.breaker.success()
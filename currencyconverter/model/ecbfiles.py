@@ -0,0 +1,194 @@
+import csv
+from typing import IO
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+
+from .history import RateHistory
+from .ratefiles import RateFile
+
+"""
+This module contains the parsers for the CSV and XML history files of the European Central Bank. The files are read
+incrementally and written straight into blocks of a columnar array, so the memory that is needed while parsing stays
+close to the size of the rates themselves, no matter how large the file is. It is only imported when such a file is
+loaded, see ratefiles.PARSERS.
+"""
+
+"""
+The number of rows of a block. A new block is allocated when the last one is full.
+"""
+BLOCK_ROWS = 1024
+
+"""
+The namespace of the elements of the XML files of the European Central Bank.
+"""
+ECB_NAMESPACE = '{http://www.ecb.int/vocabulary/2002-08-01/eurofxref}'
+
+
+class RowBuffer:
+    """
+    A growing table of rates with one row per date. Rows are written into fixed size blocks, so adding a row never
+    copies the rows that are already there.
+    """
+
+    def __init__(self, currencies: list[str]):
+        """
+        Initialize an empty buffer.
+        :param currencies: The currencies of the columns. More columns can be added with column().
+        """
+        self.currencies = list(currencies)
+        self._columns = {currency: i for i, currency in enumerate(self.currencies)}
+        self._width = max(len(self.currencies), 1)
+        self._dates = []
+        self._blocks = []
+        self._rows = BLOCK_ROWS
+
+    def column(self, currency: str) -> int:
+        """
+        Get the column of a currency. Unknown currencies get a new column.
+        :param currency: The currency.
+        :return: The index of the column.
+        """
+        column = self._columns.get(currency)
+        if column is None:
+            column = self._columns[currency] = len(self.currencies)
+            self.currencies.append(currency)
+            if column >= self._width:
+                self._width *= 2
+                self._blocks = [np.pad(block, ((0, 0), (0, self._width - block.shape[1])), constant_values=np.nan)
+                                for block in self._blocks]
+        return column
+
+    def row(self, date: str) -> np.ndarray:
+        """
+        Add a row of NaN values.
+        :param date: The date of the row.
+        :return: A view of the row that the rates are written into.
+        """
+        if self._rows == BLOCK_ROWS:
+            self._blocks.append(np.full((BLOCK_ROWS, self._width), np.nan))
+            self._rows = 0
+        self._dates.append(date)
+        self._rows += 1
+        return self._blocks[-1][self._rows - 1]
+
+    def set(self, currency: str, rate: float):
+        """
+        Set a rate of the last row.
+        :param currency: The currency of the rate.
+        :param rate: The rate.
+        """
+        column = self.column(currency)
+        self._blocks[-1][self._rows - 1, column] = rate
+
+    def history(self, base: str, start=None, end=None) -> RateHistory:
+        """
+        Move the rows into a rate history.
+        :param base: The currency the rates are quoted against.
+        :param start: The first date of the loaded range, defaults to the first date.
+        :param end: The last date of the loaded range, defaults to the last date.
+        :return: The history.
+        """
+        if not self._dates:
+            return RateHistory(base)
+        currencies = self.currencies if base in self._columns else self.currencies + [base]
+        dates = np.array(self._dates, dtype='datetime64[D]')
+        self._dates = []
+        # the files of the European Central Bank start with the newest date
+        order = np.argsort(dates, kind='stable')
+        rates = np.empty((len(dates), len(currencies)))
+        start_row = 0
+        for block in self._blocks[:-1] + [self._blocks[-1][:self._rows]]:
+            rates[start_row:start_row + len(block), :len(self.currencies)] = block[:, :len(self.currencies)]
+            start_row += len(block)
+        self._blocks = []
+        rates[:, currencies.index(base)] = 1.0
+        dates, rates = dates[order], rates[order]
+        keep = np.append(dates[1:] != dates[:-1], True)
+        if not keep.all():
+            dates, rates = dates[keep], rates[keep]
+        return RateHistory(base, dates, currencies, rates,
+                           [(dates[0] if start is None else np.datetime64(start, 'D'),
+                             dates[-1] if end is None else np.datetime64(end, 'D'))])
+
+
+def _rate(value: str) -> float:
+    """
+    Parse a rate. The files of the European Central Bank mark missing rates with N/A or leave them empty.
+    :param value: The rate as text.
+    :return: The rate or NaN if it is missing.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def parse_ecb_csv(f: IO[bytes]) -> RateFile:
+    """
+    Parse a CSV file of the European Central Bank, e.g. eurofxref-hist.csv. The first column contains the dates, every
+    other column the rates of one currency against the euro.
+    :param f: The file.
+    :return: The rate file.
+    """
+    reader = csv.reader(line.decode('utf-8-sig') for line in f)
+    header = next(reader, [])
+    currencies = [currency.strip() for currency in header[1:] if currency.strip()]
+    buffer = RowBuffer(currencies)
+    for record in reader:
+        if not record or not record[0].strip():
+            continue
+        row = buffer.row(record[0].strip())
+        row[:len(currencies)] = [_rate(value) for value in record[1:len(currencies) + 1]]
+    return _rate_file(buffer.history('EUR'), buffer.currencies + ['EUR'])
+
+
+def parse_ecb_xml(f: IO[bytes]) -> RateFile:
+    """
+    Parse an XML file of the European Central Bank, e.g. eurofxref-hist.xml. Every Cube element with a time attribute
+    contains one Cube element per currency with its rate against the euro.
+    :param f: The file.
+    :return: The rate file.
+    """
+    buffer = RowBuffer([])
+    parent = None
+    cube = ECB_NAMESPACE + 'Cube'
+    for event, element in iterparse(f, events=('start', 'end')):
+        if element.tag != cube:
+            continue
+        if event == 'start':
+            if 'time' in element.attrib:
+                buffer.row(element.attrib['time'])
+            elif 'currency' in element.attrib:
+                buffer.set(element.attrib['currency'], _rate(element.attrib['rate']))
+            else:
+                parent = element
+        elif 'time' in element.attrib and parent is not None:
+            # the rates of the date have been read, drop them from the tree
+            parent.clear()
+    return _rate_file(buffer.history('EUR'), buffer.currencies + ['EUR'])
+
+
+def _names(currencies: list[str]) -> dict[str, str]:
+    """
+    Get the names of currencies. Currencies that are unknown to the builtin source are named by their code.
+    :param currencies: The currencies.
+    :return: A dictionary that maps the currencies to their names.
+    """
+    from .builtin import CURRENCIES
+
+    return {currency: CURRENCIES.get(currency, currency) for currency in sorted(currencies)}
+
+
+def _rate_file(history: RateHistory, currencies: list[str]) -> RateFile:
+    """
+    Combine a history with its last rates.
+    :param history: The history.
+    :param currencies: The currencies of the file.
+    :return: The rate file. Its last rates only contain the currencies that have a rate on the last date.
+    """
+    if not len(history.dates):
+        return RateFile('', {}, _names(currencies), history)
+    latest = history.rates[-1]
+    rates = {currency: float(rate) for currency, rate in zip(history.currencies, latest) if np.isfinite(rate)}
+    return RateFile(str(history.dates[-1]), rates, _names(currencies), history)
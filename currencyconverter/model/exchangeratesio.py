@@ -1,13 +1,14 @@
-import json
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 from os import path
 import os
 from urllib.parse import urlencode
 import requests
 from requests.exceptions import Timeout, RequestException
 
-from .source import Source
+from .source import Source, RateSnapshot, ConversionContext, ConversionResult
 from ..util.appdirs import dirs
+from ..util import jsonbackend
 
 
 class ApiException(Exception):
@@ -21,19 +22,31 @@ class ExchangeRatesIO(Source):
     """
     This source uses the https://exchangeratesapi.io API to convert currencies.
     """
-    _target_currencies: list[str] = []
-    _source_currency: str = "Loading..."
-    _cache: dict[str, tuple[str, str, any]] = {}
+    _cache: dict[str, tuple[str, str, any]]
+    _snapshots: dict[str, RateSnapshot]
     _CACHE_PATH = path.join(dirs.user_cache_dir, 'exchangeratesio', 'cache.bin')
+    _HISTORY_PATH = path.join(dirs.user_cache_dir, 'exchangeratesio', 'history.npz')
+    _HISTORY_BASE = 'EUR'
+    _TIMESERIES_SPAN = 365
+    _TIMESERIES_WORKERS = 4
+    _URL = "https://api.apilayer.com/exchangerates_data"
+    _TIMEOUT = 5
+    _FIELDS = {
+        'latest': ('success', 'date', 'rates'),
+        'symbols': ('success', 'symbols'),
+        'timeseries': ('success', 'rates'),
+    }
 
     def __init__(self, config: dict):
         super().__init__(config)
+        self._cache = {}
+        self._snapshots = {}
         if path.exists(self._CACHE_PATH):
             with open(self._CACHE_PATH, 'rb') as f:
                 self._cache = pickle.loads(f.read())
         self._config = config
 
-    def available_currencies(self) -> tuple[int, dict[str, str]]:
+    def catalog(self) -> tuple[int, dict[str, str]]:
         """
         This returns the available currencies and the index of the default currency.
         :return: A tuple containing the index of the default currency and a dictionary that contains all the available
@@ -44,50 +57,107 @@ class ExchangeRatesIO(Source):
             raise ApiException("API request failed")
         index = list(data['symbols'].keys()).index('EUR')
         index = 0 if index == -1 else index
-        self._source_currency = list(data['symbols'].keys())[index]
         return index, data['symbols']
 
-    def add_target_currency(self, currency: str):
-        """
-        This adds a target currency to the list of target currencies.
-        :param currency: The currency to add.
-        """
-        self._target_currencies.append(currency)
-
-    def remove_target_currency(self, currency: str):
-        """
-        This removes a target currency from the list of target currencies.
-        :param currency: The currency to remove.
-        """
-        self._target_currencies.remove(currency)
-
-    def source_currency(self, currency: str):
-        """
-        This sets the source currency.
-        :param currency: The new source currency.
-        """
-        self._source_currency = currency
-
     def config_changed(self):
         """
         This is called when the configuration has changed.
         """
         pass
 
-    def convert(self, amount: float) -> tuple[str, list[tuple[str, float, float]]]:
+    def snapshot(self, context: ConversionContext = None) -> RateSnapshot:
+        """
+        This requests the latest rates of the source currency to the target currencies. If the rates did not change
+        since the last request, the previous snapshot is returned.
+        :param context: The conversion the rates are requested for, defaults to the context of the source.
+        :return: A snapshot that contains the source currency and the target currencies.
+        :raise ApiException: If the API returned an error.
+        """
+        context = self.context if context is None else context
+        data = self._request("latest", {"base": context.source, "symbols": ",".join(context.targets)})
+        if not data or not data["success"]:
+            raise ApiException("Invalid API response")
+        previous = self._snapshots.get(context.source)
+        rates = {**data["rates"], context.source: 1.0}
+        if previous is not None and previous.date == data["date"] \
+                and all(previous.rates.get(currency) == rate for currency, rate in rates.items()):
+            return previous
+        snapshot = RateSnapshot.create(data["date"], rates)
+        self._snapshots = {**self._snapshots, context.source: snapshot}
+        self._publish(snapshot, context.source)
+        return snapshot
+
+    def convert(self, amount: float, context: ConversionContext = None) -> ConversionResult:
         """
         This converts the given amount to all target currencies.
         :param amount: The amount to convert.
-        :return: A tuple containing the source currency and a list of tuples containing the target currency, the converted
-        amount and the rate.
+        :param context: The currencies of the conversion, defaults to the context of the source.
+        :return: The result of the conversion. If the request failed, it is empty and its date is the name of the error.
         """
         try:
-            data = self._request("latest", {"base": self._source_currency, "symbols": ",".join(self._target_currencies)})
-            if not data or not data["success"]:
-                raise ApiException("Invalid API response")
+            return super().convert(amount, context)
         except (ApiException, RequestException, Timeout, ConnectionError) as e:
-            return e.__class__.__name__, []
-        return data["date"], [(currency, amount * data["rates"][currency], data["rates"][currency]) for currency in self._target_currencies]
+            return ConversionResult(e.__class__.__name__)
+
+    def timeseries(self, start_date, end_date, currencies: list[str] = None):
+        """
+        This returns the rates of the source currency over a range of dates. Rates are cached on disk, only date ranges
+        that have not been loaded before are requested. Long ranges are split into chunks that are requested in
+        parallel.
+        :param start_date: The first date of the range.
+        :param end_date: The last date of the range.
+        :param currencies: The currencies to return the rates of, defaults to the target currencies.
+        :return: A RateHistory with the source currency as base.
+        """
+        history = self._load_history(start_date, end_date)
+        currencies = self.context.targets if currencies is None else currencies
+        return history.rebase(self.context.source).slice(start_date, end_date, list(currencies))
+
+    def rate_history(self, start_date, end_date, currencies: list[str] = None):
+        """
+        This returns the rates of a range of dates against the euro. Rates are loaded like in timeseries().
+        :param start_date: The first date of the range.
+        :param end_date: The last date of the range.
+        :param currencies: The currencies that are needed, defaults to all currencies.
+        :return: A RateHistory with the euro as base. Currencies the API has no rates for are left out.
+        """
+        history = self._load_history(start_date, end_date)
+        if currencies is not None:
+            currencies = [currency for currency in dict.fromkeys(currencies) if currency in history.currencies]
+        return history.slice(start_date, end_date, currencies)
+
+    def _load_history(self, start_date, end_date):
+        """
+        Load the cached history and request the parts of a date range that are missing.
+        :param start_date: The first date of the range.
+        :param end_date: The last date of the range.
+        :return: The whole cached history with the euro as base.
+        """
+        from .history import RateHistory, split_range
+
+        history = RateHistory.load(self._HISTORY_PATH, self._HISTORY_BASE)
+        chunks = [chunk for first, last in history.missing(start_date, end_date)
+                  for chunk in split_range(first, last, self._TIMESERIES_SPAN)]
+        try:
+            with ThreadPoolExecutor(max_workers=self._TIMESERIES_WORKERS) as executor:
+                for (first, last), rates in zip(chunks, executor.map(self._request_timeseries, chunks)):
+                    history.merge_json(rates, first, last)
+        finally:
+            if chunks:
+                history.save(self._HISTORY_PATH)
+        return history
+
+    def _request_timeseries(self, chunk: tuple) -> dict[str, dict[str, float]]:
+        """
+        This requests the rates of a range of dates.
+        :param chunk: A tuple containing the first and the last date of the range.
+        :return: A dictionary that maps ISO dates to dictionaries that map currencies to rates.
+        """
+        data = self._request("timeseries", {"start_date": str(chunk[0]), "end_date": str(chunk[1]),
+                                            "base": self._HISTORY_BASE}, cache=False)
+        if not data or not data["success"]:
+            raise ApiException("Invalid API response")
+        return data["rates"]
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
@@ -101,23 +171,28 @@ class ExchangeRatesIO(Source):
         with open(self._CACHE_PATH, 'wb') as f:
             f.write(pickle.dumps(self._cache))
 
-    def _request(self, endpoint: str, params: dict) -> any:
+    def _request(self, endpoint: str, params: dict, cache: bool = True) -> any:
         """
         This sends a request to the API.
         :param endpoint: The endpoint to send the request to.
         :param params: The parameters to send with the request.
-        :return: The parsed response of the API.
+        :param cache: Whether the response is kept in the cache and revalidated with the next request.
+        :return: The parsed response of the API. Only the fields that are used by this source are kept.
         """
-        url = f"https://api.apilayer.com/exchangerates_data/{endpoint}?{urlencode(params)}"
+        url = f"{self._URL}/{endpoint}?{urlencode(params)}"
         cache_key = f"{endpoint} {urlencode(params)}"
-        headers = {'apikey': self.config['apikey']}
-        if cache_key in self._cache:
+        headers = {'apikey': self.config['apikey'], 'Accept-Encoding': 'gzip, deflate'}
+        if cache and cache_key in self._cache:
             headers["If-None-Match"] = self._cache[cache_key][0]
             headers["If-Modified-Since"] = self._cache[cache_key][1]
-        with requests.request('GET', url, headers=headers) as response:
+        with requests.request('GET', url, headers=headers, timeout=self._TIMEOUT) as response:
             if response.status_code == 304:
                 return self._cache[cache_key][2]
             elif response.status_code == 200:
-                data = json.loads(response.text)
-                self._cache[cache_key] = (response.headers.get("ETag"), response.headers.get("Date"), data)
+                data = jsonbackend.loads(response.content)
+                if endpoint in self._FIELDS:
+                    data = {field: data[field] for field in self._FIELDS[endpoint] if field in data}
+                if cache:
+                    entry = (response.headers.get("ETag"), response.headers.get("Date"), data)
+                    self._cache = {**self._cache, cache_key: entry}
                 return data
@@ -0,0 +1,396 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from .source import Source, RateSnapshot, ConversionContext, ConversionResult
+from .exchangeratesio import ExchangeRatesIO
+from .local import Local
+from .builtin import Builtin
+
+
+class TierFailure(Exception):
+    """
+    This exception is raised when a tier of the fallback chain returns an unusable result.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    This class keeps track of the failures of a tier. After a number of consecutive failures the breaker opens and the
+    tier is skipped until the cool-down period has passed. After that a single trial call is let through.
+    """
+
+    def __init__(self, threshold: int = 3, cool_down: float = 60.0):
+        """
+        Initialize the circuit breaker.
+        :param threshold: The number of consecutive failures after which the breaker opens.
+        :param cool_down: The number of seconds a tier is skipped after the breaker opened.
+        """
+        self.threshold = threshold
+        self.cool_down = cool_down
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self) -> bool:
+        """
+        Check whether the tier may be called.
+        :return: True if the breaker is closed or the cool-down period has passed.
+        """
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.cool_down:
+            # half open: let one call through, a failure reopens the breaker immediately
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return True
+        return False
+
+    def success(self):
+        """
+        Record a successful call. This closes the breaker.
+        """
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        """
+        Record a failed call. This opens the breaker once the threshold is reached.
+        """
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class Call:
+    """
+    A call of a tier in a worker thread. It knows when it started running, whether it has finished and whether the
+    caller gave up on it.
+    """
+
+    def __init__(self):
+        self.started = None
+        self.finished = False
+        self.abandoned = False
+        self.failed = False
+
+
+class Tier:
+    """
+    A single source of the fallback chain together with its circuit breaker. Calls the caller gave up on keep running
+    in their worker thread, the tier is not called again until they have finished.
+    """
+
+    def __init__(self, source_class, config: dict, timeout: float = None):
+        """
+        Initialize the tier and create its source.
+        :param source_class: The class of the source of this tier.
+        :param config: The configuration for the source.
+        :param timeout: The largest number of seconds a request of the source may take. The request timeout of sources
+        that have one (_TIMEOUT) is capped to it, so abandoned calls end soon after the caller gave up on them.
+        """
+        self.name = source_class.__name__
+        self.source_class = source_class
+        self.source = None
+        self.timeout = timeout
+        self.breaker = CircuitBreaker()
+        self.abandoned = 0
+        self._lock = threading.Lock()
+        self.create(config)
+
+    def create(self, config: dict):
+        """
+        Create the source of this tier. If it can not be created, the tier is skipped until the configuration changes.
+        :param config: The configuration for the source.
+        """
+        try:
+            self.source = self.source_class(config)
+        except Exception:
+            self.source = None
+            return
+        if self.timeout is not None and hasattr(self.source, '_TIMEOUT'):
+            self.source._TIMEOUT = min(self.source._TIMEOUT, self.timeout)
+
+    def available(self) -> bool:
+        """
+        Check whether this tier can be called right now.
+        :return: True if the source exists, no abandoned call is still running and the circuit breaker is not open.
+        """
+        return self.source is not None and not self.abandoned and self.breaker.allow()
+
+    def call(self, function):
+        """
+        Call a function with the source of this tier and record the outcome in the circuit breaker.
+        :param function: The function to call with the source.
+        :return: The result of the function.
+        """
+        return self._run(Call(), function)
+
+    def submit(self, executor, function) -> tuple[Future, Call]:
+        """
+        Call a function with the source of this tier in a worker thread.
+        :param executor: The executor to run the call in.
+        :param function: The function to call with the source.
+        :return: A tuple containing the future of the result and the call, whose start time is set once it runs.
+        """
+        call = Call()
+        return executor.submit(self._run, call, function), call
+
+    def abandon(self, future: Future, call: Call, failed: bool = True):
+        """
+        Give up on a call. A call that has not started yet is cancelled. The outcome of a running call is ignored once
+        it finishes.
+        :param future: The future of the call.
+        :param call: The call.
+        :param failed: Whether a running call counts as failure, e.g. because it took too long.
+        """
+        if future.cancel():
+            return
+        with self._lock:
+            if call.finished:
+                return
+            call.abandoned = True
+            call.failed = failed
+            self.abandoned += 1
+        if failed:
+            self.breaker.failure()
+
+    def _run(self, call: Call, function):
+        """
+        Run a call and record its outcome in the circuit breaker. The success of an abandoned call is not recorded, the
+        caller did not use it. Its failure is, unless it was counted when the call was abandoned.
+        :param call: The call.
+        :param function: The function to call with the source.
+        :return: The result of the function.
+        """
+        call.started = time.monotonic()
+        try:
+            result = function(self.source)
+        except Exception:
+            # a call that was abandoned as failure has been counted already
+            if not self._finish(call) or not call.failed:
+                self.breaker.failure()
+            raise
+        if self._finish(call):
+            self.breaker.success()
+        return result
+
+    def _finish(self, call: Call) -> bool:
+        """
+        Mark a call as finished.
+        :param call: The call.
+        :return: False if the call was abandoned, so its success must not be recorded.
+        """
+        with self._lock:
+            call.finished = True
+            if call.abandoned:
+                self.abandoned -= 1
+                return False
+            return True
+
+
+class Fallback(Source):
+    """
+    This source chains the other sources. A conversion is served from an in-memory cache if possible, otherwise from
+    ExchangeRatesIO, Local and Builtin in that order, all under a latency budget. If a tier does not answer within the
+    hedge delay the next tier is queried in parallel and the first usable answer wins. Only the answers of the first
+    tier are cached, so the lower tiers are only used while it fails.
+    """
+    _currencies: dict[str, str] = None
+    _cache: dict[str, tuple[float, str, RateSnapshot]]
+
+    LATENCY_BUDGET = 2.0
+    HEDGE_DELAY = 0.5
+    CACHE_TTL = 600.0
+
+    """
+    The number of worker threads of the remote tiers. Every tier has at most one abandoned call running per caller, so
+    the threads are shared by concurrent conversions without queueing a tier behind calls that were given up on.
+    """
+    WORKERS = 8
+
+    def __init__(self, config: dict):
+        """
+        Initialize the fallback chain. Sources that can not be created are skipped.
+        :param config: The configuration for this source. It is shared with the sources of the chain.
+        """
+        super().__init__(config)
+        self._cache = {}
+        self._remote = [Tier(ExchangeRatesIO, config, self.LATENCY_BUDGET), Tier(Local, config, self.LATENCY_BUDGET)]
+        self._last = Tier(Builtin, config)
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS)
+
+    def _tiers(self) -> list[Tier]:
+        """
+        Get all tiers of the chain.
+        :return: A list of all tiers in order.
+        """
+        return self._remote + [self._last]
+
+    def close(self):
+        """
+        Close all sources of the chain.
+        """
+        self._executor.shutdown(wait=False)
+        for tier in self._tiers():
+            if tier.source is not None:
+                tier.source.close()
+
+    def catalog(self) -> tuple[int, dict[str, str]]:
+        """
+        This returns the available currencies and the index of the default currency of the first tier that answers.
+        :return: A tuple containing the index of the default currency and a dictionary that contains all the available
+        currencies.
+        """
+        if self._currencies is None:
+            _, (_, self._currencies) = self._race(lambda source: source.catalog())
+        index = list(self._currencies.keys()).index('EUR')
+        index = 0 if index == -1 else index
+        return index, self._currencies
+
+    def snapshot(self, context: ConversionContext = None) -> RateSnapshot:
+        """
+        This returns a snapshot from the first tier that answers within the latency budget.
+        :param context: The conversion the snapshot is needed for, defaults to the context of the source.
+        :return: A snapshot that contains the currencies of the conversion.
+        :raise TierFailure: If no tier could provide the rates.
+        """
+        return self._serve(self.context if context is None else context)[1]
+
+    def convert(self, amount: float, context: ConversionContext = None) -> ConversionResult:
+        """
+        This converts the given amount to all target currencies using the first tier that answers within the latency
+        budget. The result names the tier that served it and the age of its data, its date contains them as well.
+        :param amount: The amount to convert.
+        :param context: The currencies of the conversion, defaults to the context of the source.
+        :return: The result of the conversion. If no tier answered, it is empty and its date is the name of the error.
+        """
+        context = self.context if context is None else context
+        try:
+            tier, snapshot = self._serve(context)
+        except TierFailure as e:
+            return ConversionResult(e.__class__.__name__)
+
+        result = snapshot.convert(amount, context)
+        result.served_by = tier
+        result.data_age = self._age(result.date)
+        if result.data_age is not None:
+            result.date = f"{result.date} via {tier}, {self._format_age(result.data_age)} old"
+        return result
+
+    def _serve(self, context: ConversionContext) -> tuple[str, RateSnapshot]:
+        """
+        Get a snapshot for a conversion from the cache or the first tier that answers.
+        :param context: The currencies of the conversion.
+        :return: A tuple containing the name of the tier that served the snapshot and the snapshot. Cached snapshots are
+        named after the tier they came from.
+        """
+        cached = self._cache.get(context.source)
+        if cached is not None and time.monotonic() - cached[0] < self.CACHE_TTL and cached[2].covers(context):
+            return f"{cached[1]} (cached)", cached[2]
+
+        def snapshot(source):
+            result = source.snapshot(context)
+            if not result.covers(context):
+                raise TierFailure(f"{source.__class__.__name__} has no rates for the conversion")
+            return result
+
+        tier, result = self._race(snapshot)
+        if tier == self._remote[0].name:
+            if cached is not None and cached[2].date == result.date:
+                result = RateSnapshot.create(result.date, {**cached[2].rates, **result.rates})
+            self._cache = {**self._cache, context.source: (time.monotonic(), tier, result)}
+        self._publish(result, context.source)
+        return tier, result
+
+    def config_changed(self):
+        """
+        This method is called when the configuration has changed. Sources that could not be created before are
+        created again.
+        """
+        self._cache = {}
+        self._currencies = None
+        for tier in self._tiers():
+            if tier.source is None:
+                tier.create(self.config)
+            else:
+                tier.source.config_changed()
+            tier.breaker.success()
+
+    def _race(self, function) -> tuple[str, any]:
+        """
+        Call a function with the tiers of the chain. The remote tiers are called in order in worker threads, the next
+        one is started as soon as the previous one failed or the hedge delay has passed since it started running. Tiers
+        whose abandoned calls are still running are skipped. Calls that did not answer within the latency budget are
+        abandoned and count as failures, the last tier is called directly then.
+        :param function: The function to call with a source. It raises an exception if the result is not usable.
+        :return: A tuple containing the name of the tier that answered and the result of the function.
+        """
+        start = time.monotonic()
+        deadline = start + self.LATENCY_BUDGET
+        queue = [tier for tier in self._remote if tier.available()]
+        pending: dict[Future, tuple[Tier, Call]] = {}
+        last_call = None
+        while queue or pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            # the hedge delay counts from the start of the last call, not from when it was queued
+            next_launch = now if not pending else (last_call.started or now) + self.HEDGE_DELAY
+            if queue and now >= next_launch:
+                tier = queue.pop(0)
+                future, last_call = tier.submit(self._executor, function)
+                pending[future] = tier, last_call
+                continue
+            timeout = deadline - now if not queue else min(deadline, next_launch) - now
+            done, _ = wait(pending, max(timeout, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                tier, _ = pending.pop(future)
+                if future.exception() is None:
+                    # the other calls lost the race, they did not fail
+                    self._abandon(pending, False)
+                    return tier.name, future.result()
+        self._abandon(pending, True)
+
+        if not self._last.available():
+            raise TierFailure("no tier available")
+        try:
+            return self._last.name, self._last.call(function)
+        except Exception as e:
+            raise TierFailure(str(e)) from e
+
+    @staticmethod
+    def _abandon(pending: dict[Future, tuple[Tier, Call]], failed: bool):
+        """
+        Give up on the calls that have not answered yet.
+        :param pending: The futures of the calls with their tier and call.
+        :param failed: Whether the calls count as failures of their tiers.
+        """
+        for future, (tier, call) in pending.items():
+            tier.abandon(future, call, failed)
+
+    @staticmethod
+    def _age(date: str):
+        """
+        Get the age of the data of a conversion.
+        :param date: The date of the data.
+        :return: The age in seconds or None if the date could not be parsed.
+        """
+        try:
+            return max((datetime.now() - datetime.strptime(date, '%Y-%m-%d')).total_seconds(), 0.0)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _format_age(age: float) -> str:
+        """
+        Format the age of data for displaying it.
+        :param age: The age in seconds.
+        :return: The formatted age.
+        """
+        if age >= 86400:
+            return f"{int(age // 86400)} d"
+        if age >= 3600:
+            return f"{int(age // 3600)} h"
+        return f"{int(age // 60)} min"
@@ -0,0 +1,248 @@
+import numpy as np
+
+"""
+This module contains the currency graph. Quoted rates are stored as edge weights in log space (the weight of an edge is
+the negative logarithm of its rate), so the best conversion path is the shortest path and an arbitrage opportunity or an
+inconsistent cross rate is a negative cycle.
+"""
+
+
+class RateGraph:
+    """
+    All pairs best conversion rates between a fixed set of currencies. The shortest paths are computed with a vectorized
+    Floyd-Warshall algorithm. The graph also keeps the shortest paths that avoid the currency whose table was updated
+    last (the pivot), so updating the table of the same currency again only costs a single O(n^2) step.
+
+    Updates are only incremental while the same currency is updated repeatedly, as with a single source that quotes
+    everything against one base. Updating the table of another currency makes it the pivot and recomputes all paths
+    that avoid it, which is a full O(n^3) Floyd-Warshall run (about 25 ms for the currencies of CURRENCIES).
+    Callers that alternate between several bases should batch their updates per base.
+    """
+
+    """
+    Paths have to be shorter by this much in log space to replace another path. Without it, rounding errors in
+    consistent cross rates form tiny negative cycles.
+    """
+    TOLERANCE = 1e-9
+
+    def __init__(self, currencies: list[str]):
+        """
+        Initialize an empty graph.
+        :param currencies: The currencies of the graph, e.g. the keys of CURRENCIES.
+        """
+        self.currencies = list(currencies)
+        self._columns = {currency: i for i, currency in enumerate(self.currencies)}
+        size = len(self.currencies)
+        self.weights = np.full((size, size), np.inf)
+        np.fill_diagonal(self.weights, 0.0)
+        self._pivot = None
+        self._excluded = None
+        self._excluded_next = None
+        self._via_pivot = None
+        self._into_via = None
+        self._out_via = None
+        self._cycle_via = None
+        self.distances = self.weights.copy()
+
+    @classmethod
+    def from_rates(cls, base: str, rates: dict[str, float], currencies: list[str] = None) -> 'RateGraph':
+        """
+        Build a graph from the rate table of a source.
+        :param base: The currency the rates are quoted against.
+        :param rates: A dictionary that maps currencies to the amount of that currency one unit of base buys.
+        :param currencies: The currencies of the graph, defaults to the currencies of the table.
+        :return: The graph.
+        """
+        graph = cls(currencies if currencies is not None else list(dict.fromkeys([base, *rates])))
+        graph.update(base, rates)
+        return graph
+
+    def update(self, base: str, rates: dict[str, float]):
+        """
+        Set the quoted rates of a base currency. Every quote adds an edge from base to the currency and the inverse
+        edge back, replacing earlier edges between the same currencies. Currencies that are not part of the graph are
+        ignored.
+        :param base: The currency the rates are quoted against.
+        :param rates: A dictionary that maps currencies to the amount of that currency one unit of base buys.
+        """
+        b = self._columns[base]
+        quoted = [(self._columns[currency], rate) for currency, rate in rates.items()
+                  if currency in self._columns and currency != base and rate > 0]
+        if quoted:
+            columns = np.array([column for column, _ in quoted])
+            log_rates = np.log(np.array([rate for _, rate in quoted], dtype=float))
+            self.weights[b, columns] = -log_rates
+            self.weights[columns, b] = log_rates
+
+        if self._pivot != b:
+            self._pivot = b
+            self._excluded, self._excluded_next = self._floyd_warshall(b)
+        self._apply_pivot()
+
+    def _floyd_warshall(self, excluded: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute all shortest paths that do not touch one vertex.
+        :param excluded: The vertex to leave out.
+        :return: A tuple containing the distance matrix and the next hop matrix.
+        """
+        size = len(self.currencies)
+        distances = self.weights.copy()
+        distances[excluded, :] = np.inf
+        distances[:, excluded] = np.inf
+        distances[excluded, excluded] = 0.0
+        next_hop = np.where(np.isfinite(distances), np.arange(size)[np.newaxis, :], -1)
+        # negative cycles make distances diverge, they are reported by arbitrage() instead
+        with np.errstate(over='ignore', invalid='ignore'):
+            for k in range(size):
+                if k == excluded:
+                    continue
+                through = distances[:, k, np.newaxis] + distances[np.newaxis, k, :]
+                better = through < distances - self.TOLERANCE
+                distances = np.where(better, through, distances)
+                next_hop = np.where(better, next_hop[:, k, np.newaxis], next_hop)
+        return distances, next_hop
+
+    def _apply_pivot(self):
+        """
+        Add the pivot vertex to the shortest paths that avoid it.
+        """
+        with np.errstate(over='ignore', invalid='ignore'):
+            self._apply_pivot_step()
+
+    def _apply_pivot_step(self):
+        """
+        Compute the shortest paths through the pivot vertex. Instead of next hops, the last vertex before and the first
+        vertex after the pivot are kept, so paths through the pivot are joined from two paths that avoid it.
+        """
+        b = self._pivot
+        excluded = self._excluded
+        size = len(self.currencies)
+
+        # paths into the pivot: i -> ... -> k -> b
+        into = excluded + self.weights[np.newaxis, :, b]
+        into[:, b] = np.inf
+        self._into_via = np.argmin(into, axis=1)
+        into_distance = into[np.arange(size), self._into_via]
+
+        # paths out of the pivot: b -> k -> ... -> j
+        out = self.weights[b, :, np.newaxis] + excluded
+        out[b, :] = np.inf
+        self._out_via = np.argmin(out, axis=0)
+        out_distance = out[self._out_via, np.arange(size)]
+
+        # round trips from the pivot: b -> k -> ... -> l -> b
+        cycle = out_distance + self.weights[:, b]
+        cycle[b] = np.inf
+        self._cycle_via = int(np.argmin(cycle))
+        into_distance[b] = 0.0
+        out_distance[b] = cycle[self._cycle_via] if cycle[self._cycle_via] < -self.TOLERANCE else 0.0
+
+        through = into_distance[:, np.newaxis] + out_distance[np.newaxis, :]
+        self._via_pivot = through < excluded - self.TOLERANCE
+        self._via_pivot[b, :] = True
+        self._via_pivot[:, b] = True
+        self.distances = np.where(self._via_pivot, through, excluded)
+
+    def _path(self, i: int, j: int) -> list[int]:
+        """
+        Get the vertices along the shortest path between two vertices. With negative cycles the path may run into a
+        cycle, it then ends at the first repeated vertex.
+        :param i: The first vertex.
+        :param j: The last vertex.
+        :return: The vertices along the path or an empty list if there is no path.
+        """
+        if not np.isfinite(self.distances[i, j]):
+            return []
+        if not self._via_pivot[i, j]:
+            return self._excluded_path(i, j)
+        b = self._pivot
+        head = [b] if i == b else self._excluded_path(i, int(self._into_via[i])) + [b]
+        if j != b:
+            tail = self._excluded_path(int(self._out_via[j]), j)
+        elif i == b and self.distances[b, b] < 0:
+            tail = self._excluded_path(int(self._out_via[self._cycle_via]), self._cycle_via) + [b]
+        else:
+            tail = []
+        return head + tail
+
+    def _excluded_path(self, i: int, j: int) -> list[int]:
+        """
+        Get the vertices along the shortest path between two vertices that avoids the pivot.
+        :param i: The first vertex.
+        :param j: The last vertex.
+        :return: The vertices along the path.
+        """
+        path = [i]
+        if i == j and self._excluded[i, i] >= -self.TOLERANCE:
+            return path
+        while True:
+            hop = int(self._excluded_next[path[-1], j])
+            if hop < 0:
+                return []
+            repeated = hop in path
+            path.append(hop)
+            if hop == j or repeated:
+                return path
+
+    def best_rates(self) -> np.ndarray:
+        """
+        Get the best conversion rates between all currencies.
+        :return: A matrix whose element [i, j] is the best rate from currencies[i] to currencies[j], 0 if there is no
+        path.
+        """
+        with np.errstate(over='ignore'):
+            return np.exp(-self.distances)
+
+    def rate(self, base: str, target: str) -> float:
+        """
+        Get the best conversion rate between two currencies.
+        :param base: The currency to convert from.
+        :param target: The currency to convert to.
+        :return: The best rate, 0 if there is no path.
+        """
+        with np.errstate(over='ignore'):
+            return float(np.exp(-self.distances[self._columns[base], self._columns[target]]))
+
+    def best_path(self, base: str, target: str) -> tuple[list[str], float]:
+        """
+        Get the best conversion path between two currencies.
+        :param base: The currency to convert from.
+        :param target: The currency to convert to.
+        :return: A tuple containing the currencies along the path and the rate of the path. The path is empty if there
+        is no path.
+        """
+        path = self._path(self._columns[base], self._columns[target])
+        if not path:
+            return [], 0.0
+        return [self.currencies[k] for k in path], self.rate(base, target)
+
+    def arbitrage(self) -> list[tuple[list[str], float]]:
+        """
+        Find negative cycles, i.e. round trips that end with more money than they started with. While there are negative
+        cycles, the best rates and paths of the currencies that can reach them are not meaningful. At most one cycle is
+        reported per currency on a negative cycle, so the result names every affected currency but not every cycle. With quotes from a
+        single consistent table there are none, so every cycle points to an arbitrage opportunity or a data error.
+        :return: A list of tuples containing the currencies of the cycle, starting and ending with the same currency,
+        and the factor the money is multiplied with along the cycle.
+        """
+        cycles = []
+        seen = set()
+        for i in np.flatnonzero(np.diag(self.distances) < -self.TOLERANCE):
+            # the walk may lead into a cycle and out of it again, keep the first simple cycle
+            walk, positions, cycle = self._path(int(i), int(i)), {}, None
+            for position, vertex in enumerate(walk):
+                if vertex in positions:
+                    cycle = walk[positions[vertex]:position + 1]
+                    break
+                positions[vertex] = position
+            if cycle is None:
+                continue
+            start = cycle.index(min(cycle))
+            cycle = cycle[start:-1] + cycle[:start] + [cycle[start]]
+            if tuple(cycle) in seen:
+                continue
+            seen.add(tuple(cycle))
+            log_gain = -sum(self.weights[a, b] for a, b in zip(cycle, cycle[1:]))
+            if log_gain > self.TOLERANCE:
+                cycles.append(([self.currencies[k] for k in cycle], float(np.exp(log_gain))))
+        return cycles
@@ -0,0 +1,274 @@
+import os
+from os import path
+
+import numpy as np
+
+"""
+This module contains the columnar store for exchange rate histories. Rates are kept in a two-dimensional array with one
+row per date and one column per currency, so whole series can be sliced, rebased and converted without Python loops.
+"""
+
+
+def to_day(date) -> np.datetime64:
+    """
+    Convert a date to a numpy day.
+    :param date: A datetime.date, an ISO formatted string or a numpy datetime64.
+    :return: The date as numpy datetime64 with a resolution of one day.
+    """
+    return np.datetime64(date, 'D')
+
+
+def split_range(start, end, span: int) -> list[tuple[np.datetime64, np.datetime64]]:
+    """
+    Split an inclusive date range into chunks of at most span days.
+    :param start: The first date of the range.
+    :param end: The last date of the range.
+    :param span: The maximum number of days of a chunk.
+    :return: A list of tuples containing the first and the last date of every chunk.
+    """
+    start, end = to_day(start), to_day(end)
+    starts = np.arange(start, end + 1, span)
+    return [(first, min(first + span - 1, end)) for first in starts]
+
+
+class RateHistory:
+    """
+    The exchange rates of one base currency over time. Missing rates are NaN. The history also remembers which date
+    ranges have been loaded, so only missing ranges have to be fetched again.
+    """
+    base: str
+    dates: np.ndarray
+    currencies: list[str]
+    rates: np.ndarray
+    covered: list[tuple[np.datetime64, np.datetime64]]
+
+    def __init__(self, base: str, dates: np.ndarray = None, currencies: list[str] = None, rates: np.ndarray = None,
+                 covered: list[tuple[np.datetime64, np.datetime64]] = None):
+        """
+        Initialize the history.
+        :param base: The base currency of all rates.
+        :param dates: The sorted dates of the rows.
+        :param currencies: The currencies of the columns.
+        :param rates: The rates with one row per date and one column per currency.
+        :param covered: The inclusive date ranges that have been loaded.
+        """
+        self.base = base
+        self.currencies = list(currencies or [])
+        self.dates = np.array([], dtype='datetime64[D]') if dates is None else dates.astype('datetime64[D]')
+        self.rates = np.empty((len(self.dates), len(self.currencies))) if rates is None else rates
+        self.covered = list(covered or [])
+
+    def index(self, currency: str) -> int:
+        """
+        Get the column of a currency.
+        :param currency: The currency.
+        :return: The index of the column.
+        :raise KeyError: If there are no rates for the currency.
+        """
+        try:
+            return self.currencies.index(currency)
+        except ValueError:
+            raise KeyError(currency) from None
+
+    def missing(self, start, end) -> list[tuple[np.datetime64, np.datetime64]]:
+        """
+        Get the parts of a date range that have not been loaded yet.
+        :param start: The first date of the range.
+        :param end: The last date of the range.
+        :return: A list of inclusive date ranges.
+        """
+        start, end = to_day(start), to_day(end)
+        gaps = []
+        for first, last in self.covered:
+            if last < start or first > end:
+                continue
+            if first > start:
+                gaps.append((start, first - 1))
+            start = max(start, last + 1)
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def merge(self, dates: np.ndarray, currencies: list[str], rates: np.ndarray, start=None, end=None):
+        """
+        Merge rates into the history. Rows of dates that are already known are replaced.
+        :param dates: The dates of the new rows.
+        :param currencies: The currencies of the columns of the new rows.
+        :param rates: The new rates with one row per date and one column per currency.
+        :param start: The first date of the loaded range, defaults to the first new date.
+        :param end: The last date of the loaded range, defaults to the last new date. If it is yesterday or later, the
+        range is only marked as loaded up to the last new date.
+        """
+        dates = np.asarray(dates).astype('datetime64[D]')
+        known = set(self.currencies)
+        all_currencies = self.currencies + [currency for currency in currencies if currency not in known]
+        if self.base not in all_currencies:
+            all_currencies.append(self.base)
+        columns = {currency: i for i, currency in enumerate(all_currencies)}
+
+        old = np.full((len(self.dates), len(all_currencies)), np.nan)
+        old[:, :len(self.currencies)] = self.rates
+        new = np.full((len(dates), len(all_currencies)), np.nan)
+        new[:, [columns[currency] for currency in currencies]] = rates
+        new[:, columns[self.base]] = 1.0
+
+        combined_dates = np.concatenate((self.dates, dates))
+        order = np.argsort(combined_dates, kind='stable')
+        combined_dates = combined_dates[order]
+        keep = np.append(combined_dates[1:] != combined_dates[:-1], True)
+
+        self.currencies = all_currencies
+        self.dates = combined_dates[keep]
+        self.rates = np.vstack((old, new))[order][keep]
+        if len(dates):
+            start = to_day(dates.min() if start is None else start)
+            end = to_day(dates.max() if end is None else end)
+            # the rates of recent dates may still be published, so they only count as loaded once they were returned
+            if end >= np.datetime64('today', 'D') - 1:
+                end = min(end, dates.max())
+            self._cover(start, end)
+
+    def merge_json(self, rates: dict[str, dict[str, float]], start, end):
+        """
+        Merge rates in the format of the timeseries endpoint of the API into the history.
+        :param rates: A dictionary that maps ISO dates to dictionaries that map currencies to rates.
+        :param start: The first date of the loaded range.
+        :param end: The last date of the loaded range.
+        """
+        currencies = sorted({currency for day in rates.values() for currency in day})
+        columns = {currency: i for i, currency in enumerate(currencies)}
+        values = np.full((len(rates), len(currencies)), np.nan)
+        for row, day in enumerate(rates.values()):
+            values[row, [columns[currency] for currency in day]] = list(day.values())
+        self.merge(np.array(list(rates.keys()), dtype='datetime64[D]'), currencies, values, start, end)
+
+    def _cover(self, start: np.datetime64, end: np.datetime64):
+        """
+        Mark a date range as loaded. Overlapping and adjacent ranges are joined.
+        :param start: The first date of the range.
+        :param end: The last date of the range.
+        """
+        covered = []
+        for first, last in sorted(self.covered + [(start, end)]):
+            if covered and first <= covered[-1][1] + 1:
+                covered[-1] = (covered[-1][0], max(covered[-1][1], last))
+            else:
+                covered.append((first, last))
+        self.covered = covered
+
+    def slice(self, start=None, end=None, currencies: list[str] = None) -> 'RateHistory':
+        """
+        Get a part of the history.
+        :param start: The first date, defaults to the first known date.
+        :param end: The last date, defaults to the last known date.
+        :param currencies: The currencies to keep, defaults to all currencies.
+        :return: A new history that shares no data with this one.
+        """
+        mask = np.ones(len(self.dates), dtype=bool)
+        if start is not None:
+            mask &= self.dates >= to_day(start)
+        if end is not None:
+            mask &= self.dates <= to_day(end)
+        columns = list(range(len(self.currencies))) if currencies is None else [self.index(c) for c in currencies]
+        return RateHistory(self.base, self.dates[mask], [self.currencies[i] for i in columns],
+                           self.rates[np.ix_(mask, columns)], self.covered)
+
+    def rebase(self, base: str) -> 'RateHistory':
+        """
+        Express all rates relative to another base currency.
+        :param base: The new base currency. It has to be one of the currencies of this history.
+        :return: A new history with the given base currency.
+        """
+        if base == self.base:
+            return self
+        return RateHistory(base, self.dates, self.currencies, self.rates / self.rates[:, [self.index(base)]],
+                           self.covered)
+
+    def convert(self, amount: float) -> np.ndarray:
+        """
+        Convert an amount of the base currency for every date and currency.
+        :param amount: The amount to convert.
+        :return: An array with one row per date and one column per currency.
+        """
+        return amount * self.rates
+
+    def filled(self) -> np.ndarray:
+        """
+        Get the rates with every missing rate replaced by the last known rate of its currency.
+        :return: An array with one row per date and one column per currency. Rates before the first known rate of a
+        currency stay NaN.
+        """
+        known = np.isfinite(self.rates)
+        last = np.where(known, np.arange(len(self.dates))[:, np.newaxis], 0)
+        np.maximum.accumulate(last, axis=0, out=last)
+        filled = self.rates[last, np.arange(len(self.currencies))[np.newaxis, :]]
+        filled[~np.maximum.accumulate(known, axis=0)] = np.nan
+        return filled
+
+    def convert_asof(self, dates, amounts, currencies, target: str,
+                     max_age: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Convert many amounts, each with the rates that were valid on its own date. The rows are joined to the last date
+        of the history that is not after their date, with a single binary search over all dates and a gather of the
+        rates, instead of a lookup per row.
+        :param dates: The date of every row.
+        :param amounts: The amount of every row.
+        :param currencies: The currency of every row.
+        :param target: The currency to convert all amounts to.
+        :param max_age: The largest number of days a rate may be older than its row, defaults to any age.
+        :return: A tuple containing the converted amounts and the dates of the rates that were used. Rows without a
+        rate are NaN and NaT.
+        :raise KeyError: If there are no rates for the target currency.
+        """
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        amounts = np.asarray(amounts, dtype=float)
+        target_column = self.index(target)
+        if not len(self.dates):
+            return np.full(len(dates), np.nan), np.full(len(dates), np.datetime64('NaT'), dtype='datetime64[D]')
+        codes, inverse = np.unique(np.asarray(currencies), return_inverse=True)
+        known = {currency: i for i, currency in enumerate(self.currencies)}
+        # currencies without rates point at an extra column of NaN
+        columns = np.array([known.get(str(code), len(self.currencies)) for code in codes], dtype=np.intp)[inverse]
+
+        filled = self.filled()
+        filled = np.hstack((filled, np.full((len(self.dates), 1), np.nan)))
+        rows = np.searchsorted(self.dates, dates, side='right') - 1
+        valid = rows >= 0
+        if max_age is not None:
+            valid &= dates - self.dates[np.maximum(rows, 0)] <= np.timedelta64(max_age, 'D')
+        rows = np.maximum(rows, 0)
+
+        converted = amounts / filled[rows, columns] * filled[rows, target_column]
+        # rows of unknown currencies or before their first rate have no rate, even if their date matched
+        valid &= np.isfinite(converted)
+        converted[~valid] = np.nan
+        rate_dates = np.where(valid, self.dates[rows], np.datetime64('NaT'))
+        return converted, rate_dates
+
+    def save(self, file_path: str):
+        """
+        Save the history to a file. The file is replaced atomically.
+        :param file_path: The path of the file.
+        """
+        if not path.exists(path.dirname(file_path)):
+            os.makedirs(path.dirname(file_path))
+        covered = np.array(self.covered, dtype='datetime64[D]').reshape(-1, 2)
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, base=np.array(self.base), dates=self.dates, currencies=np.array(self.currencies, dtype=str),
+                     rates=self.rates, covered=covered)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str, base: str) -> 'RateHistory':
+        """
+        Load a history from a file.
+        :param file_path: The path of the file.
+        :param base: The base currency of the history if the file does not exist.
+        :return: The loaded history or an empty history if the file does not exist.
+        """
+        if not path.isfile(file_path):
+            return cls(base)
+        with np.load(file_path) as data:
+            return cls(str(data['base']), data['dates'], data['currencies'].tolist(), data['rates'],
+                       [(first, last) for first, last in data['covered']])
@@ -1,18 +1,21 @@
-import json
-
-from .source import Source
+from . import ratefiles
+from .source import Source, RateSnapshot, ConversionContext, ConversionResult
 
 
 class Local(Source):
     """
-    This source is used to load the data from a local file.
+    This source is used to load the data from a local file. The parser is chosen by the extension of the file, see
+    ratefiles.PARSERS. Conversions use the rates of the last date of the file, currencies without a rate on that date
+    (e.g. currencies that were replaced by the euro) are only part of the history.
     """
-    date: str
     currencies: dict[str, str]
-    rates: dict[str, float]
 
-    _target_currencies: list[str] = []
-    _source_currency: str = "Loading..."
+    """
+    All rates of the loaded file as RateHistory, None if the file only contains the rates of a single date.
+    """
+    history: 'RateHistory'
+
+    _snapshot: RateSnapshot
 
     def __init__(self, config):
         """
@@ -26,7 +29,7 @@ class Local(Source):
     def close(self):
         pass
 
-    def available_currencies(self) -> tuple[int, dict[str, str]]:
+    def catalog(self) -> tuple[int, dict[str, str]]:
         """
         This returns the available currencies and the index of the default currency.
         :return: A tuple containing the index of the default currency and a dictionary that contains all the available
@@ -34,47 +37,50 @@ class Local(Source):
         """
         index = list(self.currencies.keys()).index('EUR')
         index = 0 if index == -1 else index
-        self._source_currency = list(self.currencies.keys())[index]
         return index, self.currencies
 
-    def add_target_currency(self, currency: str):
+    def snapshot(self, context: ConversionContext = None) -> RateSnapshot:
         """
-        This method is called when a target currency is added.
-        :param currency: The currency that is added.
+        This returns the rates of the loaded file.
+        :param context: Not used, the snapshot always contains all currencies of the file.
+        :return: The snapshot of the loaded file.
         """
-        self._target_currencies.append(currency)
+        return self._snapshot
 
-    def remove_target_currency(self, currency: str):
+    def convert(self, amount: float, context: ConversionContext = None) -> ConversionResult:
         """
-        This method is called when a target currency is removed.
-        :param currency: The currency that is removed.
+        This converts the given amount with the rates of the last date of the file.
+        :param amount: The amount to convert.
+        :param context: The currencies of the conversion, defaults to the context of the source.
+        :return: The result of the conversion. If a currency has no rate on the last date, it is empty and its date is
+        the name of the error.
         """
-        self._target_currencies.remove(currency)
+        context = self.context if context is None else context
+        snapshot = self._snapshot
+        if not snapshot.covers(context):
+            return ConversionResult(KeyError.__name__)
+        return snapshot.convert(amount, context)
 
-    def source_currency(self, currency: str):
+    def rate_history(self, start_date, end_date, currencies: list[str] = None) -> 'RateHistory':
         """
-        This method is called when the source currency is changed.
-        :param currency: The new source currency.
+        This returns all rates of the loaded file. For history files that are all rates of the file, the range is not
+        used to cut them, so the last rates before the range are part of the result.
+        :param start_date: Not used.
+        :param end_date: Not used.
+        :param currencies: Not used.
+        :return: The history of the loaded file.
         """
-        self._source_currency = currency
-
-    def convert(self, amount: float) -> tuple[str, list[tuple[str, float, float]]]:
-        """
-        This method is called when the user wants to convert an amount of money.
-        :param amount: The amount of money to convert.
-        :return: A tuple containing the date of the conversion and a list of tuples containing the target currency, the
-        converted amount and the exchange rate.
-        """
-        return self.date, [(currency, amount / self.rates[self._source_currency] * self.rates[currency], self.rates[currency] / self.rates[self._source_currency]) for currency in self._target_currencies]
+        if self.history is None:
+            return super().rate_history(start_date, end_date, list(self._snapshot.rates))
+        return self.history
 
     def config_changed(self):
         """
         This method is called when the configuration has changed. It loads the data from the file according to the configuration.
+        The new rates are published as a new snapshot, conversions that are running keep using the old one.
         """
-        data = {}
-        with open(self.config['path']) as f:
-            data = json.load(f)
-
-        self.date = data['date']
-        self.currencies = data['currencies']
-        self.rates = data['rates']
+        rate_file = ratefiles.load(self.config['path'])
+        self.history = rate_file.history
+        self._snapshot = RateSnapshot.create(rate_file.date, rate_file.rates)
+        self.currencies = {code: name for code, name in rate_file.currencies.items() if code in self._snapshot.rates}
+        self._publish(self._snapshot)
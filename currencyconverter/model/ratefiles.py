@@ -0,0 +1,74 @@
+import importlib
+import json
+from os import path
+from typing import IO, NamedTuple
+
+"""
+This module loads exchange rate files. Besides the JSON layout of the currency converter, the CSV and XML history files
+of the European Central Bank are supported, see ecbfiles.py. The parsers of history files are only imported when such a
+file is loaded, so loading a JSON file needs neither numpy nor the tables of the builtin source.
+"""
+
+
+class RateFile(NamedTuple):
+    """
+    The contents of a rate file.
+    """
+
+    """
+    The last date of the file.
+    """
+    date: str
+
+    """
+    The rates of the last date against a common base currency. Currencies without a rate on that date are left out.
+    """
+    rates: dict[str, float]
+
+    """
+    A dictionary that maps the currencies of the file to their names.
+    """
+    currencies: dict[str, str]
+
+    """
+    All rates of the file as RateHistory, None if the file only contains the rates of a single date.
+    """
+    history: 'RateHistory' = None
+
+
+def parse_json(f: IO[bytes]) -> RateFile:
+    """
+    Parse a file in the JSON layout of the currency converter. It contains the rates of a single date.
+    :param f: The file.
+    :return: The rate file.
+    """
+    data = json.load(f)
+    return RateFile(data['date'], {currency: float(rate) for currency, rate in data['rates'].items()},
+                    data['currencies'])
+
+
+"""
+The parsers by file extension, as description and 'module:function' path relative to this package. Every parser reads
+a file that is opened in binary mode and returns a RateFile.
+"""
+PARSERS: dict[str, tuple[str, str]] = {
+    '.json': ('JSON files', '.ratefiles:parse_json'),
+    '.csv': ('ECB CSV files', '.ecbfiles:parse_ecb_csv'),
+    '.xml': ('ECB XML files', '.ecbfiles:parse_ecb_xml'),
+}
+
+
+def load(file_path: str) -> RateFile:
+    """
+    Load a rate file with the parser for its extension.
+    :param file_path: The path of the file.
+    :return: The rate file.
+    :raise ValueError: If there is no parser for the extension of the file.
+    """
+    extension = path.splitext(file_path)[1].lower()
+    if extension not in PARSERS:
+        raise ValueError(f"unsupported rate file {file_path}")
+    module, function = PARSERS[extension][1].split(':')
+    parser = getattr(importlib.import_module(module, __package__), function)
+    with open(file_path, 'rb') as f:
+        return parser(f)
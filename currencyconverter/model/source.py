@@ -1,4 +1,263 @@
+import itertools
+import threading
 from abc import ABC, abstractmethod
+from array import array
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple
+
+_versions = itertools.count(1)
+
+
+class ConversionResult:
+    """
+    The result of a conversion. The converted amounts and the rates are stored in parallel arrays of doubles instead of
+    a tuple per target currency. They support the buffer protocol, so they can be shared with NumPy without copying.
+    Rows are only formatted when they are displayed.
+    """
+    __slots__ = ('date', 'rate_date', 'targets', 'amounts', 'rates', 'version', 'served_by', 'data_age')
+
+    """
+    The text that is displayed as date of the result. Sources may add to it, e.g. the tier that served the rates.
+    """
+    date: str
+
+    """
+    The date of the rates as it was passed to the result, without anything added for displaying it.
+    """
+    rate_date: str
+
+    targets: tuple[str, ...]
+    amounts: array
+    rates: array
+    version: int
+
+    """
+    The name of the source that served the rates if the source chains other sources, otherwise None.
+    """
+    served_by: str | None
+
+    """
+    The age of the rates in seconds if the source knows it, otherwise None.
+    """
+    data_age: float | None
+
+    def __init__(self, date: str, targets: tuple[str, ...] = (), amounts: array = None, rates: array = None,
+                 version: int = 0):
+        """
+        Initialize the result.
+        :param date: The date of the rates or the name of the error if the conversion failed.
+        :param targets: The target currencies.
+        :param amounts: The converted amounts in the order of the targets.
+        :param rates: The exchange rates in the order of the targets.
+        :param version: The version of the snapshot the result was computed from, 0 if there was none.
+        """
+        self.date = date
+        self.rate_date = date
+        self.targets = targets
+        self.amounts = array('d') if amounts is None else amounts
+        self.rates = array('d') if rates is None else rates
+        self.version = version
+        self.served_by = None
+        self.data_age = None
+
+    def __len__(self) -> int:
+        """
+        Get the number of target currencies.
+        """
+        return len(self.amounts)
+
+    def __getitem__(self, index: int) -> tuple[str, float, float]:
+        """
+        Get a single row of the result.
+        :param index: The index of the target currency.
+        :return: A tuple containing the target currency, the converted amount and the exchange rate.
+        """
+        return self.targets[index], self.amounts[index], self.rates[index]
+
+    def as_numpy(self):
+        """
+        Get the amounts and the rates as NumPy arrays that share memory with this result.
+        :return: A tuple containing the amounts and the rates.
+        """
+        import numpy as np
+        return np.frombuffer(self.amounts, dtype=np.float64), np.frombuffer(self.rates, dtype=np.float64)
+
+    def format(self, index: int, currencies: dict[str, str]) -> str:
+        """
+        Format a single row for displaying it.
+        :param index: The index of the target currency.
+        :param currencies: A dictionary that maps currencies to their names.
+        :return: The formatted row.
+        """
+        target = self.targets[index]
+        return f" are {round(self.amounts[index], 2)} {currencies[target]} ({target}) (rate: {self.rates[index]})"
+
+
+class RateSnapshot(NamedTuple):
+    """
+    An immutable table of exchange rates. Sources publish a new snapshot when their data changes instead of modifying
+    the old one, so readers never see a half-updated table and need no locks.
+    """
+
+    """
+    A number that increases with every published snapshot.
+    """
+    version: int
+
+    """
+    The date of the rates.
+    """
+    date: str
+
+    """
+    The rates of all currencies against a common base currency.
+    """
+    rates: Mapping[str, float]
+
+    @classmethod
+    def create(cls, date: str, rates: dict[str, float]) -> 'RateSnapshot':
+        """
+        Create a snapshot with the next version number.
+        :param date: The date of the rates.
+        :param rates: The rates of all currencies against a common base currency. The dictionary is copied.
+        :return: The new snapshot.
+        """
+        return cls(next(_versions), date, MappingProxyType(dict(rates)))
+
+    def covers(self, context: 'ConversionContext') -> bool:
+        """
+        Check whether the snapshot contains all currencies of a conversion.
+        :param context: The conversion context.
+        :return: True if the source currency and all target currencies have rates.
+        """
+        return context.source in self.rates and all(currency in self.rates for currency in context.targets)
+
+    def rate(self, source: str, target: str) -> float:
+        """
+        Get the exchange rate between two currencies.
+        :param source: The currency to convert from.
+        :param target: The currency to convert to.
+        :return: The amount of the target currency one unit of the source currency buys.
+        """
+        return self.rates[target] / self.rates[source]
+
+    def convert(self, amount: float, context: 'ConversionContext') -> ConversionResult:
+        """
+        Convert an amount to all target currencies of a conversion context.
+        :param amount: The amount of the source currency.
+        :param context: The conversion context.
+        :return: The result of the conversion.
+        """
+        source_rate = self.rates[context.source]
+        rates = array('d', [self.rates[currency] / source_rate for currency in context.targets])
+        amounts = array('d', [amount * rate for rate in rates])
+        return ConversionResult(self.date, context.targets, amounts, rates, self.version)
+
+
+class ConversionContext(NamedTuple):
+    """
+    The currencies of a conversion. Contexts are immutable, every change returns a new context, so each caller can keep
+    its own context and convert concurrently with the same source.
+    """
+
+    """
+    The currency to convert from.
+    """
+    source: str = "Loading..."
+
+    """
+    The currencies to convert to.
+    """
+    targets: tuple[str, ...] = ()
+
+    def with_source(self, currency: str) -> 'ConversionContext':
+        """
+        Get a context with another source currency.
+        :param currency: The new source currency.
+        """
+        return self._replace(source=currency)
+
+    def with_target(self, currency: str) -> 'ConversionContext':
+        """
+        Get a context with an additional target currency.
+        :param currency: The target currency to add.
+        """
+        return self._replace(targets=self.targets + (currency,))
+
+    def without_target(self, currency: str) -> 'ConversionContext':
+        """
+        Get a context without a target currency.
+        :param currency: The target currency to remove.
+        """
+        targets = list(self.targets)
+        targets.remove(currency)
+        return self._replace(targets=tuple(targets))
+
+
+class ConversionRequest(NamedTuple):
+    """
+    A single conversion of a batch.
+    """
+
+    """
+    The currency to convert from.
+    """
+    source: str
+
+    """
+    The amount of the source currency.
+    """
+    amount: float
+
+    """
+    The currencies to convert to.
+    """
+    targets: tuple[str, ...]
+
+
+class RateChange(NamedTuple):
+    """
+    An event that is pushed to the subscribers of a source when it publishes rates that differ from the rates it
+    published before.
+    """
+
+    """
+    The version of the snapshot that contains the new rates.
+    """
+    version: int
+
+    """
+    The date of the new rates.
+    """
+    date: str
+
+    """
+    The currency the rates are quoted against, None if they are quoted against the common base of the snapshot.
+    """
+    base: str | None
+
+    """
+    The currencies whose rate changed or that are new, with their new rate against the base. Currencies that are no
+    longer available have a rate of NaN. It is empty if only the date changed.
+    """
+    changed: Mapping[str, float]
+
+    """
+    The snapshot that contains the new rates.
+    """
+    snapshot: RateSnapshot
+
+    def affects(self, context: ConversionContext) -> tuple[int, ...]:
+        """
+        Get the target currencies of a conversion whose rate is changed by this event.
+        :param context: The conversion context.
+        :return: The indices of the affected target currencies, all of them if the rate of the source currency changed.
+        """
+        if self.base is not None and self.base != context.source:
+            return ()
+        if self.base is None and context.source in self.changed:
+            return tuple(range(len(context.targets)))
+        return tuple(i for i, currency in enumerate(context.targets) if currency in self.changed)
 
 
 class Source(ABC):
@@ -9,12 +268,79 @@ class Source(ABC):
 
     config: dict
 
+    """
+    The configuration format of the source. Sources that are provided through entry points declare it here, it is read
+    when the source is configured.
+    """
+    CONFIG: dict = {}
+
+    """
+    The conversion context that is used if convert is called without one. It is changed by the controller.
+    """
+    context: ConversionContext
+
+    """
+    The callbacks that are called with a RateChange when the source publishes new rates. The tuple is replaced, never
+    modified, so it can be iterated without a lock.
+    """
+    _listeners: tuple[Callable[[RateChange], None], ...] = ()
+
     def __init__(self, config: dict):
         """
         This method is called when the source is initialized. It gets the configuration from the controller.
         :param config: The configuration for this source.
         """
         self.config = config
+        self.context = ConversionContext()
+        self._published = {}
+        self._publish_lock = threading.Lock()
+
+    def subscribe(self, listener: Callable[[RateChange], None]) -> Callable[[], None]:
+        """
+        Subscribe to rate changes. The listener is called in the thread that loaded the new rates, it has to hand the
+        event over to another thread itself if needed.
+        :param listener: The callback that is called with every RateChange.
+        :return: A function that unsubscribes the listener.
+        """
+        self._listeners = self._listeners + (listener,)
+
+        def unsubscribe():
+            self._listeners = tuple(other for other in self._listeners if other is not listener)
+        return unsubscribe
+
+    def _publish(self, snapshot: RateSnapshot, base: str = None):
+        """
+        Push the rates of a snapshot to the subscribers, if they differ from the rates that were published before. Only
+        the currencies whose rate changed are part of the event.
+        :param snapshot: The snapshot.
+        :param base: The currency to quote the rates against. Snapshots that only contain the rates of one conversion
+        are compared per source currency. If it is None, the rates are compared as they are.
+        """
+        if base is None:
+            rates = snapshot.rates
+        elif base in snapshot.rates:
+            base_rate = snapshot.rates[base]
+            rates = {currency: rate / base_rate for currency, rate in snapshot.rates.items()}
+        else:
+            return
+        with self._publish_lock:
+            date, previous = self._published.get(base, (None, {}))
+            changed = {currency: rate for currency, rate in rates.items() if previous.get(currency) != rate}
+            if base is None:
+                changed.update((currency, float('nan')) for currency in previous if currency not in rates)
+            else:
+                # the snapshot may only contain the currencies of one conversion, the others are still valid
+                rates = {**previous, **rates}
+            if not changed and date == snapshot.date:
+                return
+            self._published[base] = (snapshot.date, rates)
+        # the rates are recorded without subscribers too, so the first event only contains real changes
+        listeners = self._listeners
+        if not listeners:
+            return
+        event = RateChange(snapshot.version, snapshot.date, base, MappingProxyType(changed), snapshot)
+        for listener in listeners:
+            listener(event)
 
     @abstractmethod
     def close(self):
@@ -23,48 +349,88 @@ class Source(ABC):
         """
         pass
 
-    @abstractmethod
     def available_currencies(self) -> tuple[int, dict[str, str]]:
         """
-        This returns the available currencies and the index of the default currency.
+        This returns the available currencies and the index of the default currency, and selects the default currency
+        as source currency.
         :return: A tuple containing the index of the default currency and a dictionary that contains all the available
         currencies.
         """
-        pass
+        index, currencies = self.catalog()
+        self.source_currency(list(currencies.keys())[index])
+        return index, currencies
+
+    def catalog(self) -> tuple[int, dict[str, str]]:
+        """
+        This returns the available currencies and the index of the default currency. Unlike available_currencies(), it
+        leaves the context of the source alone, so it can be called from another thread while the source is in use.
+        Sources implement either this method or available_currencies().
+        :return: A tuple containing the index of the default currency and a dictionary that contains all the available
+        currencies.
+        :raise NotImplementedError: If the source only implements available_currencies().
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} has no catalog")
 
-    @abstractmethod
     def add_target_currency(self, currency: str):
         """
         This method is called when a target currency is added.
         :param currency: The currency that is added.
         """
-        pass
+        self.context = self.context.with_target(currency)
 
-    @abstractmethod
     def remove_target_currency(self, currency: str):
         """
         This method is called when a target currency is removed.
         :param currency: The currency that is removed.
         """
-        pass
+        self.context = self.context.without_target(currency)
 
-    @abstractmethod
     def source_currency(self, currency: str):
         """
         This method is called when the source currency is changed.
         :param currency: The new source currency.
         """
-        pass
+        self.context = self.context.with_source(currency)
 
     @abstractmethod
-    def convert(self, amount: float) -> tuple[str, list[tuple[str, float, float]]]:
+    def snapshot(self, context: ConversionContext = None) -> RateSnapshot:
+        """
+        This returns the current rate snapshot of the source. It is safe to call from several threads.
+        :param context: The conversion the snapshot is needed for. Sources that load rates on demand only have to
+        include its currencies. Defaults to the context of the source.
+        :return: The snapshot.
+        """
+        pass
+
+    def convert(self, amount: float, context: ConversionContext = None) -> ConversionResult:
         """
         This method is called when the user wants to convert an amount of money.
         :param amount: The amount of money to convert.
-        :return: A tuple containing the date of the conversion and a list of tuples containing the target currency, the
-        converted amount and the exchange rate.
+        :param context: The currencies of the conversion, defaults to the context of the source.
+        :return: The result of the conversion.
         """
-        pass
+        context = self.context if context is None else context
+        return self.snapshot(context).convert(amount, context)
+
+    def rate_history(self, start_date, end_date, currencies: list[str] = None):
+        """
+        This returns the rates of a range of dates, e.g. for converting a ledger with the rates of every transaction
+        date. Sources that only know their current rates return them as a history of a single date.
+        :param start_date: The first date of the range.
+        :param end_date: The last date of the range.
+        :param currencies: The currencies that are needed, defaults to the currencies of the context.
+        :return: A RateHistory that contains all rates of the range and the last rates before it that are known.
+        """
+        from .history import RateHistory
+
+        currencies = list(dict.fromkeys((self.context.source, *self.context.targets) if currencies is None
+                                        else currencies))
+        snapshot = self.snapshot(ConversionContext(currencies[0], tuple(currencies[1:])))
+        base, base_rate = next(iter(snapshot.rates.items()))
+        history = RateHistory(base)
+        history.merge([snapshot.date], list(snapshot.rates),
+                      [[rate / base_rate for rate in snapshot.rates.values()]])
+        return history
 
     @abstractmethod
     def config_changed(self):
@@ -0,0 +1,315 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from .model.builtin import CURRENCIES, RATES, DATE
+from .model.exchangeratesio import ExchangeRatesIO
+from .model.source import ConversionContext
+
+"""
+This module is a soak test harness for the network path of ExchangeRatesIO. It runs a local HTTP server that imitates
+the latest and symbols endpoints of the apilayer API, including ETag/304 revalidation, and injects latency, errors and
+timeouts. A load driver converts concurrently through the source and reports latency percentiles, requests per
+conversion, the cache hit ratio and memory growth. Run it with `python -m currencyconverter.soak --help`, or use
+StandIn and soak() from a test like tests/test_soak.py.
+"""
+
+
+class Faults:
+    """
+    The faults the stand-in server injects.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, timeout_rate: float = 0.0,
+                 timeout_delay: float = 10.0, change_interval: float = 0.0):
+        """
+        Initialize the faults.
+        :param latency: The number of seconds every response is delayed.
+        :param jitter: The maximum number of seconds that are randomly added to the latency.
+        :param error_rate: The share of requests that are answered with a server error.
+        :param timeout_rate: The share of requests that are delayed by timeout_delay, so the client runs into its
+        timeout.
+        :param timeout_delay: The number of seconds a timed out request is delayed.
+        :param change_interval: The number of seconds after which the rates change, 0 for rates that never change.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.change_interval = change_interval
+
+
+class StandIn:
+    """
+    A local HTTP server that imitates the latest and symbols endpoints of the apilayer API. It can be used as a context
+    manager, the server runs in a background thread while the context is active.
+    """
+
+    def __init__(self, faults: Faults = None):
+        """
+        Initialize the server.
+        :param faults: The faults to inject, defaults to none.
+        """
+        self.faults = Faults() if faults is None else faults
+        self.counts = {'requests': 0, 'ok': 0, 'not_modified': 0, 'errors': 0, 'timeouts': 0}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        The URL to use as ExchangeRatesIO._URL.
+        """
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self) -> 'StandIn':
+        """
+        Start the server.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Stop the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, name: str):
+        """
+        Count a response.
+        :param name: The kind of the response.
+        """
+        with self._lock:
+            self.counts[name] += 1
+
+    def generation(self) -> int:
+        """
+        Get the number of times the rates have changed since the server was started.
+        """
+        if not self.faults.change_interval:
+            return 0
+        return int((time.monotonic() - self._started) / self.faults.change_interval)
+
+    def payload(self, endpoint: str, params: dict[str, str]):
+        """
+        Build the body of a response.
+        :param endpoint: The requested endpoint.
+        :param params: The query parameters of the request.
+        :return: The decoded body or None if the endpoint does not exist.
+        """
+        if endpoint == 'symbols':
+            return {'success': True, 'symbols': CURRENCIES}
+        if endpoint != 'latest':
+            return None
+        base = params.get('base', 'EUR')
+        if base not in RATES:
+            return {'success': False, 'error': {'code': 'invalid_base_currency'}}
+        drift = 1 + self.generation() * 0.0001
+        symbols = params['symbols'].split(',') if params.get('symbols') else list(RATES)
+        return {'success': True, 'timestamp': int(time.time()), 'base': base, 'date': DATE,
+                'rates': {currency: RATES[currency] / RATES[base] * drift for currency in symbols if currency in RATES}}
+
+    def _handler(self):
+        """
+        Create the request handler class of the server.
+        """
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.count('requests')
+                faults = stand_in.faults
+                if faults.timeout_rate and random.random() < faults.timeout_rate:
+                    stand_in.count('timeouts')
+                    time.sleep(faults.timeout_delay)
+                    return self._send(504, b'')
+                if faults.latency or faults.jitter:
+                    time.sleep(faults.latency + random.random() * faults.jitter)
+                if faults.error_rate and random.random() < faults.error_rate:
+                    stand_in.count('errors')
+                    return self._send(500, b'')
+
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                data = stand_in.payload(url.path.rsplit('/', 1)[-1], params)
+                if data is None:
+                    return self._send(404, b'')
+                # the timestamp changes with every response, so it is not part of the entity tag
+                tag_data = {key: value for key, value in data.items() if key != 'timestamp'}
+                etag = '"' + hashlib.sha1(json.dumps(tag_data, sort_keys=True).encode()).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    stand_in.count('not_modified')
+                    return self._send(304, b'', {'ETag': etag})
+                stand_in.count('ok')
+                return self._send(200, json.dumps(data).encode(), {'ETag': etag, 'Content-Type': 'application/json'})
+
+            def _send(self, status: int, body: bytes, headers: dict[str, str] = None):
+                headers = dict(headers or {})
+                if body and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers['Content-Encoding'] = 'gzip'
+                try:
+                    self.send_response(status)
+                    for key, value in headers.items():
+                        self.send_header(key, value)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up waiting, which is expected for injected timeouts
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def percentile(values: list[float], share: float) -> float:
+    """
+    Get a percentile of a list of values.
+    :param values: The values.
+    :param share: The percentile as a share between 0 and 1.
+    :return: The value below which the given share of values lies, NaN for no values.
+    """
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+def soak(stand_in: StandIn, duration: float = 10.0, threads: int = 8, client_timeout: float = 1.0,
+         sample_interval: float = 1.0, currencies: int = 5, contexts: int = 4) -> dict:
+    """
+    Convert concurrently through an ExchangeRatesIO source that talks to a stand-in server.
+    :param stand_in: The running stand-in server.
+    :param duration: The number of seconds to run.
+    :param threads: The number of threads that convert concurrently.
+    :param client_timeout: The request timeout of the source.
+    :param sample_interval: The number of seconds between two memory samples.
+    :param currencies: The number of target currencies of every conversion.
+    :param contexts: The number of different conversions that are repeated.
+    :return: A report that contains the number of conversions and failures, the p50 and p99 latency in seconds, the
+    requests per conversion, the cache hit ratio, the server response counts and the memory samples as tuples of
+    elapsed seconds and traced bytes.
+    """
+    # the source starts with an empty response cache in a temporary directory, so runs do not depend on the cache of
+    # the user and do not change it
+    cache_dir = tempfile.mkdtemp(prefix='currencyconverter-soak-')
+
+    class SoakSource(ExchangeRatesIO):
+        _CACHE_PATH = os.path.join(cache_dir, 'cache.bin')
+        _HISTORY_PATH = os.path.join(cache_dir, 'history.npz')
+        _URL = stand_in.url
+        _TIMEOUT = client_timeout
+
+    try:
+        return _drive(SoakSource({'apikey': 'soak'}), stand_in, duration, threads, sample_interval, currencies,
+                      contexts)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _drive(source: ExchangeRatesIO, stand_in: StandIn, duration: float, threads: int, sample_interval: float,
+           currencies: int, contexts: int) -> dict:
+    """
+    Convert concurrently through a source and build the report.
+    :param source: The source that talks to the stand-in server.
+    :param stand_in: The running stand-in server.
+    :param duration: The number of seconds to run.
+    :param threads: The number of threads that convert concurrently.
+    :param sample_interval: The number of seconds between two memory samples.
+    :param currencies: The number of target currencies of every conversion.
+    :param contexts: The number of different conversions that are repeated.
+    :return: The report, see soak().
+    """
+    codes = list(RATES)
+    # a handful of conversions that are repeated, so revalidation of cached responses is exercised
+    conversions = [ConversionContext(random.choice(codes), tuple(random.sample(codes, currencies)))
+                   for _ in range(contexts)]
+    latencies, failures = [], []
+    deadline = time.monotonic() + duration
+
+    def convert():
+        while time.monotonic() < deadline:
+            context = random.choice(conversions)
+            start = time.perf_counter()
+            result = source.convert(1.0, context)
+            latencies.append(time.perf_counter() - start)
+            if len(result) != len(context.targets):
+                failures.append(result.date)
+
+    tracemalloc.start()
+    started = time.monotonic()
+    memory = [(0.0, tracemalloc.get_traced_memory()[0])]
+    workers = [threading.Thread(target=convert, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        time.sleep(sample_interval)
+        memory.append((time.monotonic() - started, tracemalloc.get_traced_memory()[0]))
+    tracemalloc.stop()
+
+    counts = dict(stand_in.counts)
+    answered = counts['ok'] + counts['not_modified']
+    return {
+        'conversions': len(latencies),
+        'failures': len(failures),
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'requests_per_conversion': counts['requests'] / max(len(latencies), 1),
+        'cache_hit_ratio': counts['not_modified'] / max(answered, 1),
+        'responses': counts,
+        'memory': memory,
+    }
+
+
+def main():
+    """
+    Run a soak test from the command line and print the report.
+    """
+    parser = argparse.ArgumentParser(description="Soak test the ExchangeRatesIO network path against a local stand-in.")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--threads', type=int, default=8, help="concurrent converting threads")
+    parser.add_argument('--latency', type=float, default=0.01, help="seconds every response is delayed")
+    parser.add_argument('--jitter', type=float, default=0.01, help="maximum random additional delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="share of requests that time out")
+    parser.add_argument('--client-timeout', type=float, default=1.0, help="request timeout of the source")
+    parser.add_argument('--change-interval', type=float, default=2.0, help="seconds between rate changes, 0 for never")
+    args = parser.parse_args()
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.timeout_rate, args.client_timeout * 2,
+                    args.change_interval)
+    with StandIn(faults) as stand_in:
+        report = soak(stand_in, args.duration, args.threads, args.client_timeout)
+
+    print(f"conversions:             {report['conversions']} ({report['failures']} failed)")
+    print(f"latency p50 / p99:       {report['p50'] * 1000:.1f} ms / {report['p99'] * 1000:.1f} ms")
+    print(f"requests per conversion: {report['requests_per_conversion']:.2f}")
+    print(f"cache hit ratio:         {report['cache_hit_ratio']:.1%}")
+    print(f"responses:               {report['responses']}")
+    print("memory:")
+    for elapsed, size in report['memory']:
+        print(f"  {elapsed:6.1f} s  {size / 1024:10.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,102 @@
 import os
 import pickle
+import threading
 from os import path
 
 from .appdirs import dirs
 
 
+class ConfigStore:
+    """
+    This class keeps the configuration of all sources in memory. It is loaded from a single file once and written back
+    in the background shortly after a configuration changed. The file is replaced atomically, so it is never left
+    half-written.
+    """
+
+    FLUSH_DELAY = 1.0
+
+    def __init__(self, config_path: str):
+        """
+        Initialize the store. The file is not read until the first configuration is requested.
+        :param config_path: The path of the file that contains the configuration of all sources.
+        """
+        self.config_path = config_path
+        self._data = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _load(self) -> dict[str, dict]:
+        """
+        Load the configuration file if it has not been loaded yet.
+        :return: A dictionary that contains the configuration of every source.
+        """
+        if self._data is None:
+            self._data = {}
+            if path.isfile(self.config_path):
+                with open(self.config_path, 'rb') as f:
+                    self._data = pickle.load(f)
+        return self._data
+
+    def get(self, name: str) -> dict:
+        """
+        Get the stored configuration of a source. Configurations saved by older versions in a separate file per source
+        are picked up on first access.
+        :param name: The name of the source.
+        :return: A copy of the stored configuration.
+        """
+        with self._lock:
+            data = self._load()
+            if name not in data:
+                legacy_path = path.join(dirs.user_config_dir, name, 'config.bin')
+                if path.isfile(legacy_path):
+                    with open(legacy_path, 'rb') as f:
+                        data[name] = pickle.load(f)
+                    self._dirty.add(name)
+            return dict(data.get(name, {}))
+
+    def set(self, name: str, config: dict):
+        """
+        Store the configuration of a source. If it changed, a background write is scheduled.
+        :param name: The name of the source.
+        :param config: The configuration to store.
+        """
+        with self._lock:
+            data = self._load()
+            if data.get(name) == config:
+                return
+            data[name] = dict(config)
+            self._dirty.add(name)
+            if self._timer is None:
+                self._timer = threading.Timer(self.FLUSH_DELAY, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Write all configurations to disk if any of them changed. The data is written to a temporary file first, which
+        then replaces the configuration file.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            if not path.exists(path.dirname(self.config_path)):
+                os.makedirs(path.dirname(self.config_path))
+            tmp_path = f"{self.config_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(self._data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
+            self._dirty.clear()
+
+
+store = ConfigStore(path.join(dirs.user_config_dir, 'config.bin'))
+
+
 def get_config(controller, name: str, config: dict):
     """
     Get the configuration for a source.
@@ -12,12 +104,7 @@ def get_config(controller, name: str, config: dict):
     :param name: The name of the source.
     :param config: The configuration for getting the configuration.
     """
-    config_path = path.join(dirs.user_config_dir, name, 'config.bin')
-
-    data = {}
-    if path.exists(config_path) and path.isfile(config_path):
-        with open(config_path, 'rb') as f:
-            data = pickle.load(f)
+    data = store.get(name)
 
     for item, params in config.items():
         if item in data:
@@ -43,13 +130,16 @@ def configure(controller, params):
 
 def save_config(name: str, config: dict):
     """
-    Save the configuration for a source.
+    Save the configuration for a source. It is written to disk in the background, call flush_config to write it
+    immediately.
     :param name: The name of the source.
     :param config: The configuration to save.
     """
-    config_path = path.join(dirs.user_config_dir, name, 'config.bin')
+    store.set(name, config)
+
 
-    if not path.exists(path.dirname(config_path)):
-        os.makedirs(path.dirname(config_path))
-    with open(config_path, 'wb') as f:
-        pickle.dump(config, f)
+def flush_config():
+    """
+    Write all unsaved configurations to disk.
+    """
+    store.flush()
@@ -0,0 +1,31 @@
+import importlib
+import json
+
+"""
+This module decodes JSON with the fastest available parser. orjson and ujson are used when they are installed, the
+json module of the standard library is used otherwise. All backends decode bytes directly.
+"""
+
+BACKENDS = ('orjson', 'ujson', 'json')
+
+backend: str = 'json'
+loads = json.loads
+
+
+def use(name: str):
+    """
+    Select the backend that is used to decode JSON.
+    :param name: The name of the module of the backend.
+    :raise ImportError: If the backend is not installed.
+    """
+    global backend, loads
+    loads = importlib.import_module(name).loads
+    backend = name
+
+
+for _name in BACKENDS:
+    try:
+        use(_name)
+        break
+    except ImportError:
+        continue
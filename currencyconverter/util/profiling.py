@@ -0,0 +1,260 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from os import path
+
+from .appdirs import dirs
+
+"""
+This module profiles the operations of the controller. It is off by default and costs a single check per operation
+then. In full mode, every operation is run under cProfile and tracemalloc, and its profile and its largest allocations
+are written to the user cache dir. In sample mode, a background thread records the stack of the profiled thread at a
+fixed interval while an operation is running. Its overhead is low enough to leave it enabled in production, the samples are
+written as collapsed stacks that flame graph tools read.
+"""
+
+MODES = ('full', 'sample')
+
+"""
+The directory the profiles are written to.
+"""
+PROFILE_DIR = path.join(dirs.user_cache_dir, 'profiles')
+
+
+class Profiler:
+    """
+    The base class of the profilers.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize the profiler.
+        :param directory: The directory the profiles are written to. A subdirectory is created for every run.
+        """
+        self.directory = path.join(directory, time.strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}")
+        os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def operation(self, name: str):
+        """
+        Profile an operation.
+        :param name: The name of the operation.
+        """
+        yield
+
+    def close(self):
+        """
+        Stop profiling and write the remaining results.
+        """
+        pass
+
+
+class FullProfiler(Profiler):
+    """
+    A profiler that runs every operation under cProfile and tracemalloc. Nested operations are part of the profile of
+    the outermost operation.
+    """
+
+    """
+    The number of allocation sites that are written per operation.
+    """
+    TOP_ALLOCATIONS = 25
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self._count = 0
+        self._depth = 0
+
+    @contextmanager
+    def operation(self, name: str):
+        if self._depth:
+            yield
+            return
+        self._depth += 1
+        self._count += 1
+        base = path.join(self.directory, f"{self._count:04d}-{name}")
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            self._depth -= 1
+            self._write(base, name, elapsed, peak, profile, after.compare_to(before, 'lineno'))
+
+    def _write(self, base: str, name: str, elapsed: float, peak: int, profile: cProfile.Profile, allocations: list):
+        """
+        Write the results of an operation.
+        :param base: The path of the files without extension.
+        :param name: The name of the operation.
+        :param elapsed: The duration of the operation in seconds.
+        :param peak: The peak of the traced memory in bytes.
+        :param profile: The profile of the operation.
+        :param allocations: The statistics of the allocations of the operation, largest first.
+        """
+        profile.dump_stats(f"{base}.prof")
+        stats = io.StringIO()
+        pstats.Stats(profile, stream=stats).sort_stats('cumulative').print_stats(30)
+        with open(f"{base}.txt", 'w') as f:
+            f.write(f"{name}: {elapsed * 1000:.2f} ms, traced memory peak {peak / 1024:.1f} KiB\n\n")
+            f.write("Allocations:\n")
+            for statistic in allocations[:self.TOP_ALLOCATIONS]:
+                f.write(f"  {statistic}\n")
+            f.write("\n")
+            f.write(stats.getvalue())
+
+
+class SamplingProfiler(Profiler):
+    """
+    A profiler that records the stack of the thread that runs an operation at a fixed interval. Operations are not
+    slowed down, the sampling thread only wakes up at the interval and sleeps while no operation is running. Nested
+    operations are named by the path of operations, e.g. choose_source/load_source.
+    """
+
+    def __init__(self, directory: str, interval: float = 0.005):
+        """
+        Initialize the profiler and start the sampling thread.
+        :param directory: The directory the profiles are written to.
+        :param interval: The number of seconds between two samples.
+        """
+        super().__init__(directory)
+        self.interval = interval
+        self.samples = Counter()
+        self.durations = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._sample, name='profiler', daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def operation(self, name: str):
+        thread = threading.get_ident()
+        with self._lock:
+            names = self._running.setdefault(thread, [])
+            names.append(name)
+            label = '/'.join(names)
+            self._active.set()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                names.pop()
+                if not names:
+                    del self._running[thread]
+                if not self._running:
+                    self._active.clear()
+                count, total, worst = self.durations.get(label, (0, 0.0, 0.0))
+                self.durations[label] = (count + 1, total + elapsed, max(worst, elapsed))
+
+    def _sample(self):
+        """
+        Record the stacks of the running operations until the profiler is closed.
+        """
+        while not self._closed:
+            self._active.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                running = {thread: '/'.join(names) for thread, names in self._running.items()}
+            frames = sys._current_frames()
+            for thread, name in running.items():
+                frame = frames.get(thread)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[';'.join([name] + stack[::-1])] += 1
+
+    def close(self):
+        self._closed = True
+        self._active.set()
+        self._thread.join()
+        with open(path.join(self.directory, 'samples.folded'), 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(path.join(self.directory, 'operations.txt'), 'w') as f:
+            for name, (count, total, worst) in sorted(self.durations.items()):
+                f.write(f"{name}: {count} calls, {total / count * 1000:.2f} ms mean, {worst * 1000:.2f} ms max\n")
+
+
+"""
+The active profiler or None if profiling is disabled.
+"""
+profiler: Profiler = None
+
+
+def enable(mode: str, directory: str = PROFILE_DIR) -> Profiler:
+    """
+    Enable profiling. A profiler that is already active is closed first.
+    :param mode: 'full' for cProfile and tracemalloc per operation, 'sample' for low overhead sampling.
+    :param directory: The directory the profiles are written to.
+    :return: The new profiler.
+    :raise ValueError: If the mode is unknown.
+    """
+    global profiler
+    if mode not in MODES:
+        raise ValueError(f"unknown profiling mode {mode}")
+    disable()
+    profiler = FullProfiler(directory) if mode == 'full' else SamplingProfiler(directory)
+    return profiler
+
+
+def disable():
+    """
+    Disable profiling and write the remaining results.
+    """
+    global profiler
+    if profiler is not None:
+        profiler.close()
+        profiler = None
+
+
+@contextmanager
+def operation(name: str):
+    """
+    Profile an operation with the active profiler.
+    :param name: The name of the operation.
+    """
+    if profiler is None:
+        yield
+    else:
+        with profiler.operation(name):
+            yield
+
+
+def profiled(name: str):
+    """
+    A decorator that profiles every call of a function as an operation.
+    :param name: The name of the operation.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return function(*args, **kwargs)
+            with profiler.operation(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,70 @@
+"""
+This module contains the search index over a currency catalog. Short queries are answered from a prefix index over the
+codes and the words of the names, longer queries from a trigram index over the whole entries, so a query never has to
+scan the catalog.
+"""
+
+"""
+The length of the prefixes in the prefix index. Queries up to this length are answered from it.
+"""
+PREFIX_LENGTH = 2
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Get the trigrams of a text.
+    :param text: The text.
+    :return: All substrings of length three.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CurrencyIndex:
+    """
+    A search index over the currencies of a source. It is built once per catalog. Results keep the order of the
+    catalog, except that currencies whose code starts with the query come first.
+    """
+
+    def __init__(self, currencies: dict[str, str]):
+        """
+        Build the index.
+        :param currencies: A dictionary that maps the currency codes to their names.
+        """
+        self.currencies = currencies
+        self.codes = list(currencies)
+        self._texts = [f"{code} {name}".lower() for code, name in currencies.items()]
+        self._code_prefixes: dict[str, list[int]] = {}
+        self._prefixes: dict[str, set[int]] = {}
+        self._trigrams: dict[str, set[int]] = {}
+        for i, text in enumerate(self._texts):
+            code = self.codes[i].lower()
+            for length in range(1, PREFIX_LENGTH + 1):
+                self._code_prefixes.setdefault(code[:length], []).append(i)
+            for word in text.split():
+                for length in range(1, PREFIX_LENGTH + 1):
+                    self._prefixes.setdefault(word[:length], set()).add(i)
+            for trigram in trigrams(text):
+                self._trigrams.setdefault(trigram, set()).add(i)
+
+    def search(self, query: str) -> list[str]:
+        """
+        Find the currencies that match a query. Queries up to PREFIX_LENGTH characters match the start of the code or
+        of a word of the name, longer queries match anywhere in the code or the name.
+        :param query: The query, the case is ignored.
+        :return: The codes of the matching currencies.
+        """
+        query = query.strip().lower()
+        if not query:
+            return self.codes
+        if len(query) <= PREFIX_LENGTH:
+            matches = self._prefixes.get(query, set())
+        else:
+            postings = sorted((self._trigrams.get(trigram, set()) for trigram in trigrams(query)), key=len)
+            matches = postings[0].intersection(*postings[1:])
+            # the trigrams may all occur without occurring in sequence
+            matches = {i for i in matches if query in self._texts[i]}
+        first = self._code_prefixes.get(query[:PREFIX_LENGTH], []) if len(query) <= PREFIX_LENGTH else \
+            [i for i in self._code_prefixes.get(query[:PREFIX_LENGTH], []) if self._texts[i].startswith(query)]
+        first_set = set(first)
+        rest = sorted(matches - first_set)
+        return [self.codes[i] for i in first] + [self.codes[i] for i in rest]
@@ -0,0 +1,83 @@
+import os
+import pickle
+from os import path
+from typing import NamedTuple
+
+from .appdirs import dirs
+
+"""
+This module saves the state of the last session, so the next start can show the last results right away while the
+source is revalidated in the background.
+"""
+
+SESSION_PATH = path.join(dirs.user_cache_dir, 'session.bin')
+
+
+class Session(NamedTuple):
+    """
+    The state of the application when it was closed.
+    """
+
+    """
+    The name of the chosen source.
+    """
+    source_name: str
+
+    """
+    The currencies the source offered, with the index of its default currency.
+    """
+    currencies: tuple[int, dict[str, str]]
+
+    """
+    The source currency.
+    """
+    source: str
+
+    """
+    The target currencies.
+    """
+    targets: tuple[str, ...]
+
+    """
+    The amount that was converted last.
+    """
+    amount: float
+
+    """
+    The date of the last rates, None if there were no rates.
+    """
+    date: str | None
+
+    """
+    The last rates of the target currencies against the source currency.
+    """
+    rates: dict[str, float]
+
+
+def load_session(session_path: str = SESSION_PATH) -> Session | None:
+    """
+    Load the state of the last session.
+    :param session_path: The path of the session file.
+    :return: The session or None if there is none or it can not be read.
+    """
+    if not path.isfile(session_path):
+        return None
+    try:
+        with open(session_path, 'rb') as f:
+            return Session(*pickle.load(f))
+    except (OSError, pickle.UnpicklingError, EOFError, TypeError):
+        return None
+
+
+def save_session(session: Session, session_path: str = SESSION_PATH):
+    """
+    Save the state of the session. The file is replaced atomically.
+    :param session: The session.
+    :param session_path: The path of the session file.
+    """
+    if not path.exists(path.dirname(session_path)):
+        os.makedirs(path.dirname(session_path))
+    tmp_path = f"{session_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(tuple(session), f)
+    os.replace(tmp_path, session_path)
@@ -1,10 +1,48 @@
-from typing import Callable
-
+import glob
+import importlib.util
+import logging
+import os
+import time
+from os import path
+from PyQt6.QtCore import QTimer, Qt, pyqtSignal
 from PyQt6.QtGui import QActionGroup
 from PyQt6.QtWidgets import *
 from PyQt6 import uic
 
-from ..model import Source
+from ..model import SourceEntry
+from ..model.source import ConversionResult
+from ..util.appdirs import dirs
+from ..util.search import CurrencyIndex
+from .currencies import CurrencyModel, TargetPicker
+
+logger = logging.getLogger(__name__)
+
+
+def load_ui_class(name: str):
+    """
+    Load the class generated from a .ui file next to this module. The .ui file is compiled to python once and the
+    compiled module is cached in the user cache dir until the .ui file is modified.
+    :param name: The name of the .ui file without extension.
+    :return: The generated Ui_* class.
+    """
+    ui_path = path.join(path.dirname(__file__), f"{name}.ui")
+    cache_dir = path.join(dirs.user_cache_dir, 'ui')
+    module_path = path.join(cache_dir, f"{name}_{os.stat(ui_path).st_mtime_ns}.py")
+
+    if not path.isfile(module_path):
+        if not path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        for stale in glob.glob(path.join(cache_dir, f"{name}_*.py")):
+            os.remove(stale)
+        tmp_path = f"{module_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            uic.compileUi(ui_path, f)
+        os.replace(tmp_path, module_path)
+
+    spec = importlib.util.spec_from_file_location(f"{__name__}._ui_{name}", module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return next(value for key, value in vars(module).items() if key.startswith('Ui_'))
 
 
 class View(QMainWindow):
@@ -31,27 +69,98 @@ class View(QMainWindow):
     """
     A dictionary that contains the short and long form of all available currencies.
     """
-    currencies: dict[str, str]
+    currencies: dict[str, str] = None
+
+    """
+    The search index over the available currencies. It is only rebuilt when the available currencies change.
+    """
+    currency_index: CurrencyIndex = None
+
+    """
+    The model of the source currency combobox.
+    """
+    currency_model: CurrencyModel
+
+    """
+    The filterable list of target currencies inside the target menu.
+    """
+    target_picker: TargetPicker
 
     """
     A dictionary that contains all the actions that are used to configure the sources.
     """
-    config_actions: dict[str, list[QWidgetAction]] = {}
+    config_actions: dict[str, list[QWidgetAction]]
 
-    def __init__(self, controller, sources: dict[str, tuple[Callable[[dict], Source], dict]]):
+    """
+    The number of seconds between the start of the application and the first paint of the main window.
+    """
+    time_to_first_paint: float = None
+
+    """
+    Emitted with a RateChange when the source publishes new rates. Sources may publish from any thread, the signal
+    hands the event over to the thread of the window.
+    """
+    rates_changed = pyqtSignal(object)
+
+    """
+    Emitted with the results of the background revalidation of a restored session.
+    """
+    revalidated = pyqtSignal(object)
+
+    def __init__(self, controller, sources: dict[str, SourceEntry], started: float = None):
         """
-        Initialize the main window and all its widgets.
+        Initialize the main window and all its widgets. The source menu is only built when it is opened for the first
+        time.
         :param controller: The controller object that is used to communicate with the model.
-        :param sources: A dictionary that contains all the available sources and their configuration formats.
+        :param sources: A dictionary that contains the registry entries of all available sources.
+        :param started: The time.perf_counter() value at the start of the application.
         """
         super().__init__()
-        uic.loadUi("currencyconverter/view/main.ui", self)
+        ui = load_ui_class('main')()
+        ui.setupUi(self)
+        for name, widget in vars(ui).items():
+            setattr(self, name, widget)
         self.controller = controller
+        self.sources = sources
+        self.started = time.perf_counter() if started is None else started
+        self.config_actions = {}
+        self.selected_source = next(iter(sources), None)
+
+        self.menu_source.aboutToShow.connect(self.build_menu_source)
+        self.currency_model = CurrencyModel()
+        self.cb_currency.setModel(self.currency_model)
+        self.build_menu_convert()
+
+        self.reset()
+        self.action_reset.triggered.connect(controller.reset)
+
+        self.cb_currency.activated.connect(lambda x: controller.source_currency(list(self.currencies.keys())[x]))
+        self.pb_convert.clicked.connect(self.convert)
+        self.rates_changed.connect(controller.rates_changed, Qt.ConnectionType.QueuedConnection)
+        self.revalidated.connect(controller.revalidated, Qt.ConnectionType.QueuedConnection)
+
+    def paintEvent(self, event):
+        """
+        This method is called when the main window is painted. After the first paint the controller is started, so the
+        window is visible before the first source is loaded.
+        :param event: The paint event.
+        """
+        super().paintEvent(event)
+        if self.time_to_first_paint is None:
+            self.time_to_first_paint = time.perf_counter() - self.started
+            logger.info("first paint after %.1f ms", self.time_to_first_paint * 1000)
+            QTimer.singleShot(0, self.controller.start)
+
+    def build_menu_source(self):
+        """
+        This method is called when the source menu is opened. It builds the submenus of all sources once.
+        """
+        if self.config_actions:
+            return
 
         source_group = QActionGroup(self)
         source_group.setExclusive(True)
-        first_action = None
-        for source, params in sources.items():
+        for source, entry in self.sources.items():
             self.config_actions[source] = []
 
             menu = QMenu(self)
@@ -60,6 +169,7 @@ class View(QMainWindow):
             action = QWidgetAction(self)
             action.setText('select')
             action.setCheckable(True)
+            action.setChecked(source == self.selected_source)
             source_group.addAction(action)
             menu.addAction(action)
             menu.addSeparator()
@@ -68,23 +178,15 @@ class View(QMainWindow):
 
             signal_handler = lambda handler, *args, **kwargs: lambda: handler(*args, **kwargs)
             action.triggered.connect(signal_handler(self.choose_source, source))
-            first_action = action if first_action is None else first_action
 
-            for item, config in params[1].items():
+            for item, config in entry.config.items():
                 config_action = QWidgetAction(self)
                 config_action.setText(config[1])
-                config_action.setDisabled(True)
+                config_action.setEnabled(source == self.selected_source)
                 menu.addAction(config_action)
                 self.config_actions[source].append(config_action)
 
-                config_action.triggered.connect(signal_handler(controller.reconfigure, item))
-        first_action.setChecked(True)
-
-        self.reset()
-        self.action_reset.triggered.connect(controller.reset)
-
-        self.cb_currency.activated.connect(lambda x: controller.source_currency(list(self.currencies.keys())[x]))
-        self.pb_convert.clicked.connect(self.convert)
+                config_action.triggered.connect(signal_handler(self.controller.reconfigure, item))
 
     def choose_source(self, source: str):
         """
@@ -92,34 +194,24 @@ class View(QMainWindow):
         :param source: The name of the selected source.
         """
         self.controller.choose_source(source)
+        self.selected_source = source
         for _, actions in self.config_actions.items():
             for action in actions:
                 action.setDisabled(True)
 
-        for action in self.config_actions[source]:
+        for action in self.config_actions.get(source, []):
             action.setEnabled(True)
 
-    def build_menu_convert(self, target_currencies: dict[str, str] = None):
+    def build_menu_convert(self):
         """
-        This method is called when the target currencies are changed. It updates the menu that is used to select the
-        target currencies.
-        :param target_currencies: A dictionary that contains all the available target currencies.
+        Build the menu that is used to select the target currencies. It contains a single picker whose entries are
+        served by a model, so it is built once and only its model changes with the available currencies.
         """
         self.menu_convert.clear()
-
-        if target_currencies is None:
-            action = QWidgetAction(self)
-            action.setText("Loading...")
-            action.setDisabled(True)
-            self.menu_convert.addAction(action)
-        else:
-            for short, long in target_currencies.items():
-                action = QWidgetAction(self)
-                action.setText(f"{short} - {long}")
-                action.setCheckable(True)
-                signal_handler = lambda target: lambda active: self.controller.target_currency(target, active)
-                action.triggered.connect(signal_handler(short))
-                self.menu_convert.addAction(action)
+        self.target_picker = TargetPicker(self, self.controller.target_currency)
+        action = QWidgetAction(self)
+        action.setDefaultWidget(self.target_picker)
+        self.menu_convert.addAction(action)
 
     def reset(self) -> None:
         """
@@ -128,21 +220,26 @@ class View(QMainWindow):
         self.dsb_amount.setValue(10.0)
         self.cb_currency.setCurrentIndex(0)
         self.lw_output.clear()
-        self.build_menu_convert()
+        self.target_picker.model.set_selected(())
+        self.target_picker.set_loading(True)
 
-    def set_available_currencies(self, index: int, currencies: dict[str, str]):
+    def set_available_currencies(self, index: int, currencies: dict[str, str], selected: tuple[str, ...] = ()):
         """
         This method is called when the available currencies are changed. It updates the combobox that is used to select
         the source currency and the menu that is used to select the target currencies.
-        :param index:
-        :param currencies:
-        :return:
+        :param index: The index of the source currency.
+        :param currencies: A dictionary that contains all the available currencies.
+        :param selected: The target currencies that are checked.
         """
+        if self.currency_index is None or currencies != self.currencies:
+            self.currency_index = CurrencyIndex(currencies)
+            self.currency_model.set_catalog(self.currency_index)
+            self.target_picker.model.set_catalog(self.currency_index, selected)
+        else:
+            self.target_picker.model.set_selected(selected)
         self.currencies = currencies
-        self.cb_currency.clear()
-        self.cb_currency.addItems([f"{short} - {long}" for short, long in currencies.items()])
         self.cb_currency.setCurrentIndex(index)
-        self.build_menu_convert(currencies)
+        self.target_picker.set_loading(False)
 
     def convert(self):
         """
@@ -150,21 +247,31 @@ class View(QMainWindow):
         """
         self.controller.convert(self.dsb_amount.value())
 
-    def display_conversion(self, date: str, conversion: list[tuple[str, float, float]]) -> None:
+    def display_conversion(self, result: ConversionResult) -> None:
         """
         This method is called when the conversion is finished. It updates the list widget that is used to display the
         conversion result.
-        :param date: The date of the source data.
-        :param conversion: The result of the conversion.
+        :param result: The result of the conversion.
         """
-        self.set_status(f"data from {date}")
+        self.set_status(f"data from {result.date}")
         self.lw_output.clear()
 
-        if len(conversion) == 0:
+        if len(result) == 0:
             self.lw_output.addItem('No target currencies selected')
 
-        for converted in conversion:
-            self.lw_output.addItem(f" are {round(converted[1], 2)} {self.currencies[converted[0]]} ({converted[0]}) (rate: {converted[2]})")
+        for index in range(len(result)):
+            self.lw_output.addItem(result.format(index, self.currencies))
+
+    def update_conversion(self, result: ConversionResult, rows: tuple[int, ...]) -> None:
+        """
+        This method is called when some rates of the displayed conversion changed. Only the rows of the changed rates
+        are updated.
+        :param result: The updated result of the conversion.
+        :param rows: The indices of the rows that changed.
+        """
+        self.set_status(f"data from {result.date}")
+        for index in rows:
+            self.lw_output.item(index).setText(result.format(index, self.currencies))
 
     def request_string(self, title: str, placeholder: str, default: str = ""):
         """
@@ -192,13 +299,7 @@ class View(QMainWindow):
         :param file_type: The file type of the requested path.
         :param start_path: The path where the dialog should start.
         """
-        dialog = QFileDialog(self)
-        dialog.setWindowTitle(title)
-        dialog.setWindowFilePath(start_path)
-        dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
-        dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptOpen)
-        dialog.setNameFilter(file_type)
-        return dialog.getOpenFileName()[0]
+        return QFileDialog.getOpenFileName(self, title, start_path, file_type)[0]
 
     def set_status(self, message: str):
         """
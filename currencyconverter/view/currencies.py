@@ -0,0 +1,136 @@
+from typing import Callable
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PyQt6.QtWidgets import QLineEdit, QListView, QVBoxLayout, QWidget
+
+from ..util.search import CurrencyIndex
+
+"""
+This module contains the widgets that list currencies. The entries are served by item models, so the views only create
+what is visible and a new catalog or a filter only resets the model instead of creating widgets.
+"""
+
+
+class CurrencyModel(QAbstractListModel):
+    """
+    A list of currencies. The text of an entry is only formatted when a view asks for it. If the model is checkable,
+    every entry has a check box for choosing it as a target currency.
+    """
+
+    def __init__(self, checkable: bool = False, toggled: Callable[[str, bool], None] = None):
+        """
+        Initialize an empty model.
+        :param checkable: Whether the entries have a check box.
+        :param toggled: The function that is called with the currency and its new state when an entry is checked or
+        unchecked.
+        """
+        super().__init__()
+        self.checkable = checkable
+        self.toggled = toggled
+        self.index_: CurrencyIndex = None
+        self.codes: list[str] = []
+        self.selected: set[str] = set()
+        self.query = ''
+
+    def set_catalog(self, index: CurrencyIndex, selected: tuple[str, ...] = ()):
+        """
+        Show the currencies of another catalog.
+        :param index: The search index of the catalog.
+        :param selected: The target currencies that are checked.
+        """
+        self.beginResetModel()
+        self.index_ = index
+        self.selected = set(selected)
+        self.codes = index.search(self.query)
+        self.endResetModel()
+
+    def set_selected(self, selected: tuple[str, ...]):
+        """
+        Check exactly the given currencies.
+        :param selected: The target currencies that are checked.
+        """
+        self.selected = set(selected)
+        if self.codes:
+            self.dataChanged.emit(self.index(0), self.index(len(self.codes) - 1), [Qt.ItemDataRole.CheckStateRole])
+
+    def filter(self, query: str):
+        """
+        Only show the currencies that match a query.
+        :param query: The query, see CurrencyIndex.search.
+        """
+        self.query = query
+        if self.index_ is None:
+            return
+        self.beginResetModel()
+        self.codes = self.index_.search(query)
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.codes)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        code = self.codes[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{code} - {self.index_.currencies[code]}"
+        if role == Qt.ItemDataRole.CheckStateRole and self.checkable:
+            return Qt.CheckState.Checked if code in self.selected else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.UserRole:
+            return code
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        return flags | Qt.ItemFlag.ItemIsUserCheckable if self.checkable else flags
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.CheckStateRole or not self.checkable:
+            return False
+        code = self.codes[index.row()]
+        active = Qt.CheckState(value) == Qt.CheckState.Checked
+        if active == (code in self.selected):
+            return False
+        if active:
+            self.selected.add(code)
+        else:
+            self.selected.discard(code)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        if self.toggled is not None:
+            self.toggled(code, active)
+        return True
+
+
+class TargetPicker(QWidget):
+    """
+    A filter field above a list of checkable currencies. It is shown inside the menu that chooses the target
+    currencies.
+    """
+
+    def __init__(self, parent: QWidget, toggled: Callable[[str, bool], None]):
+        """
+        Initialize the picker.
+        :param parent: The parent widget.
+        :param toggled: The function that is called with the currency and its new state when it is checked or
+        unchecked.
+        """
+        super().__init__(parent)
+        self.model = CurrencyModel(True, toggled)
+        self.le_filter = QLineEdit(self)
+        self.le_filter.setClearButtonEnabled(True)
+        self.lv_currencies = QListView(self)
+        self.lv_currencies.setModel(self.model)
+        self.lv_currencies.setUniformItemSizes(True)
+        self.lv_currencies.setMinimumSize(320, 360)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(4, 4, 4, 4)
+        layout.addWidget(self.le_filter)
+        layout.addWidget(self.lv_currencies)
+        self.le_filter.textChanged.connect(self.model.filter)
+        self.set_loading(True)
+
+    def set_loading(self, loading: bool):
+        """
+        Show whether the currencies are still loading.
+        :param loading: True while the currencies are loading.
+        """
+        self.le_filter.setPlaceholderText("Loading..." if loading else "Filter")
+        self.setEnabled(not loading)
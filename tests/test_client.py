@@ -0,0 +1,75 @@
+import socket
+import threading
+
+import pytest
+
+from currencyconverter.client import Client, DaemonError
+from currencyconverter.daemon import Daemon, Server
+
+"""
+Conversions through the daemon client against a daemon with the builtin rates on a temporary socket.
+"""
+
+
+@pytest.fixture
+def socket_file(tmp_path):
+    """
+    Serve the builtin rates on a temporary socket.
+    :return: The path of the socket.
+    """
+    daemon = Daemon('Builtin')
+    server = Server(str(tmp_path / 'cc.sock'), daemon)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.path
+    server.shutdown()
+    server.server_close()
+    daemon.close()
+
+
+def test_large_batch(socket_file):
+    """
+    A batch that is larger than the socket buffers is answered completely.
+    """
+    requests = [('EUR', float(i), ('USD', 'GBP')) for i in range(20000)]
+    with Client(socket_file) as client:
+        results = client.convert_many(requests)
+    assert len(results) == len(requests)
+    date, rows = results[-1]
+    assert [target for target, _, _ in rows] == ['USD', 'GBP']
+    assert rows[0][1] == pytest.approx(19999 * rows[0][2])
+
+
+def test_error_keeps_connection(socket_file):
+    """
+    After a batch with a failed request, the connection answers the next requests correctly.
+    """
+    with Client(socket_file) as client:
+        with pytest.raises(DaemonError):
+            client.convert_many([('EUR', 1.0, ('USD',))] * 1000 + [('XXX', 1.0, ('USD',))])
+        date, rows = client.convert('EUR', 2.0, ('USD',))
+    assert rows[0][1] == pytest.approx(2 * rows[0][2])
+
+
+def test_truncated_frame(tmp_path):
+    """
+    A frame that ends early raises ConnectionError.
+    """
+    path = str(tmp_path / 'short.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+
+    def answer():
+        connection, _ = listener.accept()
+        connection.recv(1024)
+        connection.sendall(b'\x00\x00\x00\x10\x00\x00')
+        connection.close()
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    with Client(path) as client:
+        with pytest.raises(ConnectionError):
+            client.ping()
+    thread.join()
+    listener.close()
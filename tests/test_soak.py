@@ -0,0 +1,43 @@
+import pytest
+
+from currencyconverter.soak import Faults, StandIn, soak
+
+"""
+Short soak runs of ExchangeRatesIO against the local stand-in server. The full load tool is
+`python -m currencyconverter.soak`.
+"""
+
+
+def test_revalidation():
+    """
+    Repeated conversions are revalidated with the server instead of being downloaded again.
+    """
+    with StandIn() as stand_in:
+        report = soak(stand_in, duration=1.0, threads=4, sample_interval=0.25, contexts=2)
+    assert report['conversions'] > 0
+    assert report['failures'] == 0
+    assert report['responses']['not_modified'] > 0
+
+
+@pytest.mark.filterwarnings('error::pytest.PytestUnhandledThreadExceptionWarning')
+def test_faults_are_failures():
+    """
+    Injected server errors and timeouts make conversions fail without raising.
+    """
+    faults = Faults(error_rate=0.3, timeout_rate=0.1, timeout_delay=0.5)
+    with StandIn(faults) as stand_in:
+        report = soak(stand_in, duration=1.5, threads=4, client_timeout=0.2, sample_interval=0.25)
+    assert report['responses']['errors'] > 0
+    assert report['responses']['timeouts'] > 0
+    assert 0 < report['failures'] < report['conversions']
+
+
+def test_memory_is_bounded():
+    """
+    Memory does not keep growing while the same conversions are repeated.
+    """
+    with StandIn(Faults(change_interval=0.5)) as stand_in:
+        report = soak(stand_in, duration=3.0, threads=4, sample_interval=0.5)
+    sizes = [size for _, size in report['memory']]
+    # the first samples include the warm-up of the cache and the connection pools
+    assert max(sizes[2:]) - sizes[2] < 1024 * 1024